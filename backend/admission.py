@@ -0,0 +1,217 @@
+"""Admission control for expensive endpoints.
+
+Each limited route belongs to a policy with:
+- a token bucket per remote address and route (rate per second, burst).
+  This is the binding limit. Annotation routes also get a smaller bucket
+  per annotator/session inside it, so one annotator behind a shared NAT
+  cannot use up the others' share. Identities are chosen by the client,
+  so a new one per request never gets past the address bucket,
+- an optional cap on requests of the policy in flight at once,
+- a priority in a shared in-flight budget. Low-priority requests
+  (exports, scans, full listings) may not use the last ADMISSION_RESERVED
+  slots, so annotation writes still get through while dashboards poll.
+  The low-priority concurrency caps add up to more than CAPACITY -
+  RESERVED, so the reservation binds when every low policy is busy.
+
+Requests over their rate get 429 and requests that cannot get a slot
+within the policy's max_wait get 503, both with Retry-After. Limits are
+per process: with N workers the effective limits are N times higher.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import jsonify, request
+
+HIGH = "high"
+LOW = "low"
+
+# Shared in-flight budget over all limited routes. Low-priority policies
+# below may hold 10 slots together but only get CAPACITY - RESERVED = 8
+ADMISSION_CAPACITY = int(os.getenv("ADMISSION_CAPACITY", "12"))
+ADMISSION_RESERVED = int(os.getenv("ADMISSION_RESERVED", "4"))
+
+# Buckets kept per policy; least recently seen clients are dropped first
+MAX_CLIENTS = 10_000
+
+# Retry-After sent when a request is shed for lack of capacity
+BUSY_RETRY_AFTER = 2
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def take(self):
+        """Take a token; returns 0 on success or seconds until one is available"""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token bucket per client key"""
+
+    def __init__(self, rate, burst, max_clients=MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def check(self, client):
+        with self.lock:
+            bucket = self.buckets.pop(client, None)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.burst)
+                if len(self.buckets) >= self.max_clients:
+                    self.buckets.popitem(last=False)
+            self.buckets[client] = bucket
+            return bucket.take()
+
+
+class Admission:
+    """In-flight budget where low-priority requests leave reserved slots free"""
+
+    def __init__(self, capacity=ADMISSION_CAPACITY, reserved=ADMISSION_RESERVED):
+        self.capacity = capacity
+        self.reserved = min(reserved, capacity - 1)
+        self.in_flight = 0
+        self.condition = threading.Condition()
+
+    def enter(self, priority, timeout):
+        limit = self.capacity if priority == HIGH else self.capacity - self.reserved
+        with self.condition:
+            if not self.condition.wait_for(lambda: self.in_flight < limit, timeout):
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+
+def client_key():
+    return request.remote_addr or "unknown"
+
+
+def annotator_identity():
+    """Annotator/session the request claims, or None"""
+    data = request.get_json(silent=True)
+    data = data if isinstance(data, dict) else {}
+    identity = (
+        request.headers.get("X-Session-Id")
+        or request.headers.get("X-Annotator")
+        or data.get("sessionId")
+        or data.get("annotator")
+    )
+    return str(identity)[:64] if identity else None
+
+
+class Policy:
+    def __init__(
+        self,
+        rate,
+        burst,
+        concurrency=None,
+        priority=LOW,
+        max_wait=0.5,
+        identity=None,
+        identity_rate=None,
+        identity_burst=None,
+    ):
+        self.limiter = RateLimiter(rate, burst)
+        # Optional finer bucket per (address, identity), checked after the address one
+        self.identity = identity
+        self.identity_limiter = (
+            RateLimiter(identity_rate, identity_burst) if identity else None
+        )
+        self.concurrency = concurrency
+        self.slots = threading.BoundedSemaphore(concurrency) if concurrency else None
+        self.priority = priority
+        self.max_wait = max_wait
+
+
+admission = Admission()
+
+POLICIES = {
+    # Annotators must never wait behind dashboards; an address may carry
+    # several annotators, each held to the per-identity rate
+    "annotate": Policy(
+        rate=30,
+        burst=90,
+        priority=HIGH,
+        max_wait=5,
+        identity=annotator_identity,
+        identity_rate=10,
+        identity_burst=30,
+    ),
+    "media_list": Policy(rate=1, burst=5, concurrency=4),
+    "export": Policy(rate=0.1, burst=2, concurrency=2),
+    "scan": Policy(rate=0.1, burst=2, concurrency=1),
+    "reset": Policy(rate=0.1, burst=2, concurrency=1),
+    "bulk_import": Policy(rate=0.2, burst=3, concurrency=2),
+}
+
+
+def rejected(status, retry_after, message):
+    response = jsonify({"error": message, "retry_after": retry_after})
+    response.status_code = status
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def limited(policy_name):
+    """Decorate a view to run it under the named admission policy"""
+    policy = POLICIES[policy_name]
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # Buckets are per client and route; slots are shared by the policy.
+            # The address bucket comes first so made-up identities cannot
+            # mint fresh buckets past it
+            client = client_key()
+            wait = policy.limiter.check((client, view.__name__))
+            if not wait and policy.identity_limiter:
+                identity = policy.identity()
+                if identity:
+                    wait = policy.identity_limiter.check(
+                        (client, identity, view.__name__)
+                    )
+            if wait:
+                return rejected(429, math.ceil(wait), "Too many requests")
+
+            if policy.slots and not policy.slots.acquire(timeout=policy.max_wait):
+                return rejected(503, BUSY_RETRY_AFTER, "Server busy, try again later")
+            try:
+                if not admission.enter(policy.priority, policy.max_wait):
+                    return rejected(
+                        503, BUSY_RETRY_AFTER, "Server busy, try again later"
+                    )
+                try:
+                    return view(*args, **kwargs)
+                finally:
+                    admission.leave()
+            finally:
+                if policy.slots:
+                    policy.slots.release()
+
+        return wrapper
+
+    return decorator
@@ -1,29 +1,38 @@
-from flask import Flask, jsonify, request, send_from_directory, send_file
+from flask import (
+    Blueprint,
+    Flask,
+    jsonify,
+    redirect,
+    request,
+    send_from_directory,
+    send_file,
+)
 from flask_cors import CORS
+import math
 import os
 import sys
 from werkzeug.utils import secure_filename
-from datetime import datetime
+from datetime import datetime, timedelta
+
+import storage
+from storage import media_storage
 
 # Add parent directory to path to access frontend build
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-app = Flask(__name__)
-CORS(app)
+# Routes live on a blueprint; create_app() builds the Flask app on demand so
+# importing this module never touches the database or the filesystem
+api = Blueprint("api", __name__)
 
 # Configuration
-UPLOAD_FOLDER = "uploads"
+UPLOAD_FOLDER = storage.UPLOAD_ROOTS[0]
 FRONTEND_BUILD_FOLDER = os.path.join(
     os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "frontend", "build"
 )
 ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "bmp", "mp4", "avi", "mov"}
 MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB
-
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-os.makedirs(FRONTEND_BUILD_FOLDER, exist_ok=True)
-
-app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
-app.config["MAX_CONTENT_LENGTH"] = MAX_CONTENT_LENGTH
+# Resampled timelines are built in memory; cap how dense a client may ask for
+MAX_TIMELINE_RESOLUTION = 100  # Hz
 
 
 def allowed_file(filename):
@@ -33,16 +42,70 @@ def allowed_file(filename):
 # Emotions for markup
 EMOTIONS = ["angry", "sad", "neutral", "happy", "disgust", "surprise", "fear"]
 
-# Initialize database
-from database import init_database, MarkupResult
+from database import (
+    db,
+    init_database,
+    AnnotationEvent,
+    Dataset,
+    DEFAULT_DATASET_ID,
+    MarkupResult,
+    MediaPriority,
+    VersionConflict,
+    VideoAnnotation,
+)
+from media_probe import media_type_for, probe_file, probe_files
+from phash import DEFAULT_DISTANCE, MAX_DISTANCE
+import predictions
+import priority
+import releases
+from events import event_writer
+from admission import limited
+
+
+def initialize():
+    """One-time setup: upload/frontend directories and schema migrations"""
+    for root in storage.UPLOAD_ROOTS:
+        os.makedirs(root, exist_ok=True)
+    os.makedirs(FRONTEND_BUILD_FOLDER, exist_ok=True)
+    init_database()
+
+
+def create_app():
+    """Build the Flask app (run `flask --app app init` once before serving)"""
+    app = Flask(__name__)
+    CORS(app)
+    app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+    app.config["MAX_CONTENT_LENGTH"] = MAX_CONTENT_LENGTH
+    app.register_blueprint(api)
+    app.cli.command("init", help=initialize.__doc__)(initialize)
+    return app
+
+
+# Read-your-writes: after a write, this client's reads stay on the primary
+# for a few seconds even across requests, tracked with a cookie
+STICKY_COOKIE = "db_sticky_until"
 
-# Initialize database on startup
-init_database()
+
+@api.before_app_request
+def load_primary_stickiness():
+    db.set_sticky_until(request.cookies.get(STICKY_COOKIE, type=float, default=0.0))
+
+
+@api.after_app_request
+def save_primary_stickiness(response):
+    sticky_until = db.sticky_until()
+    if db.replicas and sticky_until > request.cookies.get(
+        STICKY_COOKIE, type=float, default=0.0
+    ):
+        response.set_cookie(
+            STICKY_COOKIE, str(sticky_until), max_age=int(db.sticky_seconds) + 1
+        )
+    return response
 
 
 # Serve React frontend from build folder
-@app.route("/", defaults={"path": ""})
-@app.route("/<path:path>")
+@api.route("/", defaults={"path": ""})
+@api.route("/<path:path>")
 def serve_frontend(path):
     if path != "" and os.path.exists(os.path.join(FRONTEND_BUILD_FOLDER, path)):
         return send_from_directory(FRONTEND_BUILD_FOLDER, path)
@@ -51,7 +114,7 @@ def serve_frontend(path):
 
 
 # API Routes
-@app.route("/api/health", methods=["GET"])
+@api.route("/api/health", methods=["GET"])
 def health_check():
     stats = MarkupResult.get_stats()
     return jsonify(
@@ -64,14 +127,62 @@ def health_check():
     )
 
 
-@app.route("/api/media", methods=["GET"])
-def get_all_media():
-    """Get all media items with their markup status"""
-    results = MarkupResult.get_all()
+def annotator_identity(data=None):
+    """Annotator and session from headers, falling back to the JSON body"""
+    data = data or {}
+    annotator = request.headers.get("X-Annotator") or data.get("annotator")
+    session_id = request.headers.get("X-Session-Id") or data.get("sessionId")
+    # Body values may be any JSON type; events store them as text
+    annotator = str(annotator)[:100] if annotator else "anonymous"
+    session_id = str(session_id)[:64] if session_id else None
+    return annotator, session_id
+
+
+def storage_dataset(dataset_id):
+    """Storage scope of a dataset; the default one keeps the shared layout"""
+    return None if dataset_id == DEFAULT_DATASET_ID else dataset_id
+
+
+def dataset_missing(dataset_id):
+    """404 response for unknown datasets, None if the dataset exists"""
+    if dataset_id == DEFAULT_DATASET_ID or Dataset.get_by_id(dataset_id):
+        return None
+    return jsonify({"error": "Dataset not found"}), 404
+
+
+@api.route("/api/datasets", methods=["GET"])
+def list_datasets():
+    """List datasets"""
+    return jsonify({"datasets": Dataset.get_all()})
+
+
+@api.route("/api/datasets", methods=["POST"])
+def create_dataset():
+    """Create a new dataset"""
+    data = request.json
+    if not data or not data.get("name"):
+        return jsonify({"error": "Missing required fields"}), 400
+
+    dataset = Dataset.create(data["name"], data.get("description"))
+    if not dataset:
+        return jsonify({"error": "Dataset already exists"}), 409
+    return jsonify(dataset), 201
+
+
+@api.route("/api/media", methods=["GET"], defaults={"dataset_id": DEFAULT_DATASET_ID})
+@api.route("/api/datasets/<int:dataset_id>/media", methods=["GET"])
+@limited("media_list")
+def get_all_media(dataset_id):
+    """Get all media items of a dataset with their markup status"""
+    missing = dataset_missing(dataset_id)
+    if missing:
+        return missing
+
+    results = MarkupResult.get_all(dataset_id)
     return jsonify({"items": results, "total": len(results), "emotions": EMOTIONS})
 
 
-@app.route("/api/media/<int:media_id>", methods=["GET"])
+@api.route("/api/media/<int:media_id>", methods=["GET"])
 def get_media(media_id):
     """Get specific media item"""
     media = MarkupResult.get_by_id(media_id)
@@ -81,7 +192,7 @@ def get_media(media_id):
     return jsonify(media)
 
 
-@app.route("/api/media/<int:media_id>/file", methods=["GET"])
+@api.route("/api/media/<int:media_id>/file", methods=["GET"])
 def get_media_file(media_id):
     """Serve media file"""
     media = MarkupResult.get_by_id(media_id)
@@ -90,8 +201,14 @@ def get_media_file(media_id):
 
     filepath = media["filepath"]
 
-    if os.path.exists(filepath):
-        return send_file(filepath)
+    # Remote backends hand the client a presigned URL instead of proxying
+    url = media_storage.presigned_url(filepath)
+    if url:
+        return redirect(url)
+
+    local_path = media_storage.local_path(filepath)
+    if local_path:
+        return send_file(local_path)
     else:
         # For demo, redirect to a placeholder
         if media["type"] == "image":
@@ -111,9 +228,40 @@ def get_media_file(media_id):
             )
 
 
-@app.route("/api/media/upload", methods=["POST"])
-def upload_media():
-    """Upload new media file"""
+@api.route("/api/media/<int:media_id>/duplicates", methods=["GET"])
+def get_media_duplicates(media_id):
+    """Get near-duplicates of a media item by pHash Hamming distance"""
+    media = MarkupResult.get_by_id(media_id)
+    if not media:
+        return jsonify({"error": "Media not found"}), 404
+
+    distance = request.args.get("distance", type=int, default=DEFAULT_DISTANCE)
+    if not 0 <= distance <= MAX_DISTANCE:
+        return jsonify({"error": f"distance must be between 0 and {MAX_DISTANCE}"}), 400
+
+    duplicates = MarkupResult.find_similar(
+        media["phash"], distance, media_id, media["dataset_id"]
+    )
+    return jsonify(
+        {
+            "media_id": media_id,
+            "duplicate_of": media["duplicate_of"],
+            "duplicates": duplicates,
+            "total": len(duplicates),
+        }
+    )
+
+
+@api.route(
+    "/api/media/upload", methods=["POST"], defaults={"dataset_id": DEFAULT_DATASET_ID}
+)
+@api.route("/api/datasets/<int:dataset_id>/media/upload", methods=["POST"])
+def upload_media(dataset_id):
+    """Upload new media file into a dataset"""
+    missing = dataset_missing(dataset_id)
+    if missing:
+        return missing
+
     if "file" not in request.files:
         return jsonify({"error": "No file provided"}), 400
 
@@ -125,25 +273,188 @@ def upload_media():
         return jsonify({"error": "File type not allowed"}), 400
 
     filename = secure_filename(file.filename)
-    filepath = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(filepath)
-
-    # Determine media type
-    ext = filename.rsplit(".", 1)[-1].lower()
-    media_type = "video" if ext in {"mp4", "avi", "mov"} else "image"
+    local_path = media_storage.staging_path(filename, storage_dataset(dataset_id))
+    file.save(local_path)
+    metadata = probe_file(local_path)
+    filepath = media_storage.commit(filename, local_path, storage_dataset(dataset_id))
 
-    # Create new media item
+    # Create new media item with probed dimensions, duration and codec
     media = MarkupResult.create(
         filename=filename,
         filepath=filepath,
-        media_type=media_type,
+        media_type=media_type_for(filename),
         title=os.path.splitext(filename)[0],
+        metadata=metadata,
+        dataset_id=dataset_id,
     )
+    if media is None:
+        return jsonify({"error": "File belongs to another dataset"}), 409
+    if MarkupResult.cluster_duplicates([media["id"]]):
+        media = MarkupResult.get_by_id(media["id"])
 
     return jsonify(media), 201
 
 
-@app.route("/api/annotate", methods=["POST"])
+def parse_timeline(media_id, data):
+    """Validate a timeline payload; returns (traces, segments, error)"""
+    if not isinstance(data, dict):
+        return None, None, "Timeline must be an object"
+    try:
+        sample_rate = float(data.get("sample_rate", 0))
+        start_time = float(data.get("start_time", 0))
+    except (ValueError, TypeError):
+        return None, None, "sample_rate and start_time must be numbers"
+
+    traces = []
+    for dimension in ("valence", "arousal"):
+        values = data.get(dimension)
+        if values is None:
+            continue
+        if sample_rate <= 0:
+            return None, None, "sample_rate must be positive"
+        if not isinstance(values, list):
+            return None, None, f"{dimension.capitalize()} trace must be a list"
+        try:
+            values = [float(v) for v in values]
+        except (ValueError, TypeError):
+            return None, None, f"{dimension.capitalize()} trace must contain numbers"
+        if any(not -1.0 <= v <= 1.0 for v in values):
+            return None, None, f"{dimension.capitalize()} must be between -1.0 and 1.0"
+        traces.append(
+            {
+                "media_id": media_id,
+                "dimension": dimension,
+                "sample_rate": sample_rate,
+                "start_time": start_time,
+                "values": values,
+            }
+        )
+
+    segments = data.get("segments")
+    if segments is not None:
+        if not isinstance(segments, list):
+            return None, None, "Segments must be a list"
+        for segment in segments:
+            if not isinstance(segment, dict):
+                return None, None, "Each segment must be an object"
+            if segment.get("emotion") not in EMOTIONS:
+                return None, None, "Invalid emotion tag"
+            try:
+                segment["start"] = float(segment["start"])
+                segment["end"] = float(segment["end"])
+            except (KeyError, ValueError, TypeError):
+                return None, None, "Segments need numeric start and end"
+            if segment["end"] <= segment["start"]:
+                return None, None, "Segment end must be after start"
+
+    return traces, segments, None
+
+
+@api.route("/api/media/<int:media_id>/timeline", methods=["PUT"])
+@limited("annotate")
+def save_timeline(media_id):
+    """Save valence/arousal traces and emotion segments for a video"""
+    data = request.json
+    if not data:
+        return jsonify({"error": "Missing required fields"}), 400
+
+    media = MarkupResult.get_by_id(media_id)
+    if not media:
+        return jsonify({"error": "Media not found"}), 404
+    if media["type"] != "video":
+        return jsonify({"error": "Timeline annotations are only for videos"}), 400
+
+    traces, segments, error = parse_timeline(media_id, data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    VideoAnnotation.save_traces(traces)
+    if segments is not None:
+        VideoAnnotation.save_segments(media_id, segments)
+
+    return jsonify(
+        {
+            "success": True,
+            "traces": len(traces),
+            "segments": len(segments) if segments is not None else None,
+        }
+    )
+
+
+@api.route("/api/timeline/bulk", methods=["POST"])
+@limited("annotate")
+def save_timelines_bulk():
+    """Save traces for many videos in one request; all or nothing"""
+    data = request.json
+    if not data or not isinstance(data.get("items"), list):
+        return jsonify({"error": "Missing required fields"}), 400
+
+    media_ids = []
+    for item in data["items"]:
+        media_id = item.get("mediaId") if isinstance(item, dict) else None
+        if isinstance(media_id, bool) or not isinstance(media_id, int):
+            return jsonify({"error": "Each item needs an integer mediaId"}), 400
+        media_ids.append(media_id)
+    if len(set(media_ids)) != len(media_ids):
+        return jsonify({"error": "Each mediaId may appear only once"}), 400
+
+    # Validate every item before writing anything
+    types = MarkupResult.get_types(media_ids)
+    all_traces = []
+    all_segments = {}
+    for media_id, item in zip(media_ids, data["items"]):
+        if media_id not in types:
+            return jsonify({"error": f"Media {media_id}: Media not found"}), 404
+        if types[media_id] != "video":
+            return (
+                jsonify(
+                    {
+                        "error": f"Media {media_id}: "
+                        "Timeline annotations are only for videos"
+                    }
+                ),
+                400,
+            )
+        traces, segments, error = parse_timeline(media_id, item)
+        if error:
+            return jsonify({"error": f"Media {media_id}: {error}"}), 400
+        all_traces.extend(traces)
+        if segments is not None:
+            all_segments[media_id] = segments
+
+    saved = VideoAnnotation.save_timelines(all_traces, all_segments)
+    return jsonify({"success": True, "traces": saved})
+
+
+@api.route("/api/media/<int:media_id>/timeline", methods=["GET"])
+def get_timeline(media_id):
+    """Get traces and segments, resampled to ?resolution= Hz if given"""
+    resolution = request.args.get("resolution", type=float)
+    if resolution is not None and not 0 < resolution <= MAX_TIMELINE_RESOLUTION:
+        return (
+            jsonify(
+                {
+                    "error": "resolution must be positive and at most "
+                    f"{MAX_TIMELINE_RESOLUTION} Hz"
+                }
+            ),
+            400,
+        )
+
+    if not MarkupResult.get_by_id(media_id):
+        return jsonify({"error": "Media not found"}), 404
+
+    return jsonify(
+        {
+            "media_id": media_id,
+            "traces": VideoAnnotation.get_traces(media_id, resolution),
+            "segments": VideoAnnotation.get_segments(media_id),
+        }
+    )
+
+
+@api.route("/api/annotate", methods=["POST"])
+@limited("annotate")
 def submit_annotation():
     """Submit annotation for media"""
     data = request.json
@@ -181,113 +492,385 @@ def submit_annotation():
         except (ValueError, TypeError):
             return jsonify({"error": "Arousal must be a number"}), 400
 
+    # Optional optimistic concurrency: the version the client last saw
+    expected_version = data.get("version")
+    if expected_version is not None and (
+        isinstance(expected_version, bool) or not isinstance(expected_version, int)
+    ):
+        return jsonify({"error": "Version must be an integer"}), 400
+
+    # Checked before the write so a bad value can't fail after the commit
+    time_on_item = data.get("timeOnItemMs")
+    if time_on_item is not None and (
+        isinstance(time_on_item, bool)
+        or not isinstance(time_on_item, (int, float))
+        or not math.isfinite(time_on_item)
+    ):
+        return jsonify({"error": "timeOnItemMs must be a number"}), 400
+
     # Update markup result
-    if emotion and (valence is not None or arousal is not None):
-        # Update both emotion and VAD
-        result = MarkupResult.update_emotion(media_id, emotion, valence, arousal)
-    elif emotion:
-        # Update only emotion
-        result = MarkupResult.update_emotion(media_id, emotion)
-    else:
-        # Update only VAD
-        result = MarkupResult.update_vad(media_id, valence, arousal)
+    try:
+        if emotion:
+            # Update emotion, and VAD values that were provided
+            result = MarkupResult.update_emotion(
+                media_id, emotion, valence, arousal, expected_version
+            )
+        else:
+            # Update only VAD
+            result = MarkupResult.update_vad(
+                media_id, valence, arousal, expected_version
+            )
+    except VersionConflict as e:
+        return (
+            jsonify(
+                {
+                    "error": "Media was updated by someone else",
+                    "current": e.current,
+                }
+            ),
+            409,
+        )
 
     if not result:
         return jsonify({"error": "Media not found"}), 404
 
-    # Get updated stats
-    stats = MarkupResult.get_stats()
+    if None not in (result["emotion"], result["valence"], result["arousal"]):
+        MediaPriority.mark_done(media_id)
+
+    annotator, session_id = annotator_identity(data)
+    event_writer.record(
+        "annotate",
+        annotator,
+        media_id=media_id,
+        dataset_id=result["dataset_id"],
+        session_id=session_id,
+        duration_ms=time_on_item,
+    )
+
+    # Label a near-duplicate cluster once through its representative
+    propagated = 0
+    if data.get("propagate") and result["duplicate_of"] is None:
+        propagated = MarkupResult.propagate_to_duplicates(media_id)
 
     return jsonify(
         {
             "success": True,
             "message": "Annotation saved successfully",
             "result": result,
-            "stats": stats,
+            "propagated": propagated,
         }
     )
 
 
-@app.route("/api/stats", methods=["GET"])
-def get_stats():
-    """Get annotation statistics"""
-    stats = MarkupResult.get_stats()
-    return jsonify(stats)
-
+@api.route("/api/stats", methods=["GET"], defaults={"dataset_id": DEFAULT_DATASET_ID})
+@api.route("/api/datasets/<int:dataset_id>/stats", methods=["GET"])
+def get_stats(dataset_id):
+    """Get annotation statistics of a dataset (cached for a few seconds)"""
+    missing = dataset_missing(dataset_id)
+    if missing:
+        return missing
 
-@app.route("/api/scan", methods=["POST"])
-def scan_upload_folder():
-    """Scan upload folder for new files"""
-    new_files = []
+    stats = MarkupResult.get_stats(dataset_id)
+    return jsonify(stats)
 
-    for filename in os.listdir(UPLOAD_FOLDER):
-        if filename.startswith("."):
-            continue
 
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        if os.path.isfile(filepath) and allowed_file(filename):
-            # Check if file is already in database
-            existing = MarkupResult.get_by_filename(filename)
-
-            if not existing:
-                ext = filename.rsplit(".", 1)[-1].lower()
-                media_type = "video" if ext in {"mp4", "avi", "mov"} else "image"
-
-                # Add to database
-                media = MarkupResult.create(
-                    filename=filename,
-                    filepath=filepath,
-                    media_type=media_type,
-                    title=os.path.splitext(filename)[0],
-                )
-
-                new_files.append(media)
+@api.route("/api/scan", methods=["POST"], defaults={"dataset_id": DEFAULT_DATASET_ID})
+@api.route("/api/datasets/<int:dataset_id>/scan", methods=["POST"])
+@limited("scan")
+def scan_upload_folder(dataset_id):
+    """Scan storage for new files and add them to a dataset"""
+    missing = dataset_missing(dataset_id)
+    if missing:
+        return missing
+
+    candidates = {
+        filename: filepath
+        for filename, filepath in media_storage.iter_files(storage_dataset(dataset_id))
+        if allowed_file(filename)
+    }
+
+    # Check which files are already in the dataset with a single query
+    existing = MarkupResult.get_existing_filenames(list(candidates), dataset_id)
+    pending = [
+        (name, path) for name, path in candidates.items() if name not in existing
+    ]
+
+    # Remote objects are pulled into the local cache before probing
+    local_paths = media_storage.local_paths(path for _, path in pending)
+    pending = [
+        (item, local_path)
+        for item, local_path in zip(pending, local_paths)
+        if local_path is not None
+    ]
+
+    # Probe new files across all cores, then insert them in one batch
+    metadata = probe_files(local_path for _, local_path in pending)
+    new_files = MarkupResult.create_many(
+        [
+            {
+                "filename": filename,
+                "filepath": filepath,
+                "type": media_type_for(filename),
+                "title": os.path.splitext(filename)[0],
+                "metadata": meta,
+            }
+            for ((filename, filepath), _), meta in zip(pending, metadata)
+        ],
+        dataset_id=dataset_id,
+    )
+    duplicates = MarkupResult.cluster_duplicates([media["id"] for media in new_files])
 
     return jsonify(
         {
             "message": f"Found {len(new_files)} new files",
             "files": new_files,
-            "total": MarkupResult.count(),
+            "duplicates": duplicates,
+            "total": MarkupResult.count(dataset_id),
         }
     )
 
 
-@app.route("/api/reset", methods=["POST"])
-def reset_data():
-    """Reset all annotations (keep files)"""
-    MarkupResult.reset_annotations()
+@api.route("/api/reset", methods=["POST"], defaults={"dataset_id": DEFAULT_DATASET_ID})
+@api.route("/api/datasets/<int:dataset_id>/reset", methods=["POST"])
+@limited("reset")
+def reset_data(dataset_id):
+    """Reset all annotations of a dataset (keep files)"""
+    missing = dataset_missing(dataset_id)
+    if missing:
+        return missing
+
+    MarkupResult.reset_annotations(dataset_id)
+    MediaPriority.mark_all_pending(dataset_id)
+    MarkupResult.get_stats(dataset_id, max_age=0)
 
     return jsonify(
         {
             "message": "Annotations reset successfully",
-            "total": MarkupResult.count(),
+            "total": MarkupResult.count(dataset_id),
             "annotated": 0,
         }
     )
 
 
-@app.route("/api/next", methods=["GET"])
-def get_next_media():
-    """Get next unannotated media"""
-    current_id = request.args.get("current_id", type=int, default=0)
+@api.route("/api/next", methods=["GET"], defaults={"dataset_id": DEFAULT_DATASET_ID})
+@api.route("/api/datasets/<int:dataset_id>/next", methods=["GET"])
+def get_next_media(dataset_id):
+    """Get next unannotated media of a dataset"""
+    missing = dataset_missing(dataset_id)
+    if missing:
+        return missing
 
-    media = MarkupResult.get_next_unannotated(current_id)
+    current_id = request.args.get("current_id", type=int, default=0)
+    strategy = request.args.get("strategy", default="sequential")
+    skip_duplicates = request.args.get("skip_duplicates", type=int, default=0)
+    # Route only items the models are unsure about to humans
+    max_confidence = request.args.get("max_confidence", type=float)
+
+    if strategy == "priority":
+        # Fall back to sequential order when nothing has been scored yet
+        media = MediaPriority.get_next(
+            current_id, dataset_id, bool(skip_duplicates), max_confidence
+        ) or MarkupResult.get_next_unannotated(
+            current_id, bool(skip_duplicates), dataset_id, max_confidence
+        )
+    elif strategy == "sequential":
+        media = MarkupResult.get_next_unannotated(
+            current_id, bool(skip_duplicates), dataset_id, max_confidence
+        )
+    else:
+        return jsonify({"error": "strategy must be 'sequential' or 'priority'"}), 400
 
     if media:
+        annotator, session_id = annotator_identity()
+        event_writer.record(
+            "view",
+            annotator,
+            media_id=media["id"],
+            dataset_id=dataset_id,
+            session_id=session_id,
+        )
         return jsonify({"media": media, "has_next": True})
     else:
         return jsonify({"message": "No more media to annotate", "has_next": False})
 
 
-@app.route("/api/prev", methods=["GET"])
-def get_prev_media():
-    """Get previous media"""
+def record_media_event(event_type):
+    """Record a client-side event (view/skip) on the media item in the body"""
+    data = request.json
+    if not data or "mediaId" not in data:
+        return jsonify({"error": "Missing required fields"}), 400
+
+    media = MarkupResult.get_by_id(data["mediaId"])
+    if not media:
+        return jsonify({"error": "Media not found"}), 404
+
+    annotator, session_id = annotator_identity(data)
+    event_writer.record(
+        event_type,
+        annotator,
+        media_id=media["id"],
+        dataset_id=media["dataset_id"],
+        session_id=session_id,
+        duration_ms=data.get("timeOnItemMs") if event_type == "skip" else None,
+    )
+    return jsonify({"success": True})
+
+
+@api.route("/api/view", methods=["POST"])
+def view_media():
+    """Record that an annotator was shown a media item"""
+    return record_media_event("view")
+
+
+@api.route("/api/skip", methods=["POST"])
+def skip_media():
+    """Record that an annotator skipped a media item"""
+    return record_media_event("skip")
+
+
+@api.route("/api/analytics/annotators", methods=["GET"])
+def annotator_analytics():
+    """Per-annotator throughput over the last ?hours= (default 24)"""
+    hours = request.args.get("hours", type=int, default=24)
+    dataset_id = request.args.get("dataset_id", type=int)
+    since = datetime.now() - timedelta(hours=hours)
+    return jsonify(
+        {
+            "since": since.isoformat(),
+            "annotators": AnnotationEvent.get_annotator_summary(since, dataset_id),
+        }
+    )
+
+
+@api.route("/api/analytics/throughput", methods=["GET"])
+def throughput_analytics():
+    """Hourly annotation throughput over the last ?hours= (default 24)"""
+    hours = request.args.get("hours", type=int, default=24)
+    dataset_id = request.args.get("dataset_id", type=int)
+    since = datetime.now() - timedelta(hours=hours)
+    return jsonify(
+        {
+            "since": since.isoformat(),
+            "hours": AnnotationEvent.get_hourly_throughput(since, dataset_id),
+        }
+    )
+
+
+@api.route("/api/priority/import", methods=["POST"])
+@limited("bulk_import")
+def import_priority_signals():
+    """Import per-item uncertainty/disagreement signals from our models"""
+    data = request.json
+    if not data or not isinstance(data.get("items"), list):
+        return jsonify({"error": "Missing required fields"}), 400
+
+    items = []
+    seen = set()
+    for item in data["items"]:
+        media_id = item.get("mediaId") if isinstance(item, dict) else None
+        if isinstance(media_id, bool) or not isinstance(media_id, int):
+            return jsonify({"error": "Each item needs an integer mediaId"}), 400
+        if media_id in seen:
+            return jsonify({"error": "Each mediaId may appear only once"}), 400
+        seen.add(media_id)
+        # Scorers expect signals in [0, 1]
+        for signal in ("uncertainty", "disagreement"):
+            value = item.get(signal)
+            if value is not None and (
+                isinstance(value, bool)
+                or not isinstance(value, (int, float))
+                or not 0.0 <= value <= 1.0
+            ):
+                return (
+                    jsonify(
+                        {
+                            "error": f"Media {media_id}: "
+                            f"{signal} must be a number between 0 and 1"
+                        }
+                    ),
+                    400,
+                )
+        emotion = item.get("predicted_emotion")
+        if emotion is not None and emotion not in EMOTIONS:
+            return jsonify({"error": "Invalid emotion tag"}), 400
+        items.append(
+            {
+                "media_id": media_id,
+                "uncertainty": item.get("uncertainty"),
+                "disagreement": item.get("disagreement"),
+                "predicted_emotion": emotion,
+            }
+        )
+
+    imported = MediaPriority.import_signals(items)
+    # Only the imported items got new signals; /api/priority/refresh rescores all
+    refreshed = (
+        priority.refresh_scores(media_ids=imported) if data.get("refresh", True) else 0
+    )
+    return jsonify({"imported": len(imported), "refreshed": refreshed})
+
+
+@api.route(
+    "/api/predictions/import",
+    methods=["POST"],
+    defaults={"dataset_id": DEFAULT_DATASET_ID},
+)
+@api.route("/api/datasets/<int:dataset_id>/predictions/import", methods=["POST"])
+@limited("bulk_import")
+def import_model_predictions(dataset_id):
+    """Import a JSONL/Parquet predictions file and auto-accept confident labels"""
+    missing = dataset_missing(dataset_id)
+    if missing:
+        return missing
+
+    file = request.files.get("file")
+    model = request.form.get("model")
+    if not file or not file.filename or not model:
+        return jsonify({"error": "file and model are required"}), 400
+    threshold = request.form.get(
+        "threshold", type=float, default=predictions.DEFAULT_THRESHOLD
+    )
+
+    try:
+        result = predictions.import_predictions(
+            predictions.iter_records(file.stream, file.filename),
+            model,
+            threshold,
+            dataset_id,
+        )
+    except (ValueError, KeyError) as e:
+        return jsonify({"error": f"Invalid predictions file: {e}"}), 400
+    if result["auto_accepted"]:
+        MarkupResult.get_stats(dataset_id, max_age=0)
+    return jsonify(result)
+
+
+@api.route("/api/priority/refresh", methods=["POST"])
+@limited("bulk_import")
+def refresh_priority():
+    """Recompute priority scores in batches, optionally with custom weights"""
+    data = request.json or {}
+    try:
+        refreshed = priority.refresh_scores(weights=data.get("weights"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"refreshed": refreshed})
+
+
+@api.route("/api/prev", methods=["GET"], defaults={"dataset_id": DEFAULT_DATASET_ID})
+@api.route("/api/datasets/<int:dataset_id>/prev", methods=["GET"])
+def get_prev_media(dataset_id):
+    """Get previous media of a dataset"""
+    missing = dataset_missing(dataset_id)
+    if missing:
+        return missing
+
     current_id = request.args.get("current_id", type=int, default=0)
 
     if not current_id:
         return jsonify({"error": "current_id is required"}), 400
 
-    media = MarkupResult.get_previous(current_id)
+    media = MarkupResult.get_previous(current_id, dataset_id)
 
     if media:
         return jsonify({"media": media, "has_prev": True})
@@ -295,10 +878,16 @@ def get_prev_media():
         return jsonify({"message": "No previous media", "has_prev": False})
 
 
-@app.route("/api/export", methods=["GET"])
-def export_results():
-    """Export all markup results"""
-    results = MarkupResult.get_all()
+@api.route("/api/export", methods=["GET"], defaults={"dataset_id": DEFAULT_DATASET_ID})
+@api.route("/api/datasets/<int:dataset_id>/export", methods=["GET"])
+@limited("export")
+def export_results(dataset_id):
+    """Export all markup results of a dataset"""
+    missing = dataset_missing(dataset_id)
+    if missing:
+        return missing
+
+    results = MarkupResult.get_all(dataset_id)
 
     # Create CSV format
     csv_data = "id,filename,filepath,type,emotion,created_at,updated_at\n"
@@ -315,28 +904,115 @@ def export_results():
     )
 
 
+@api.route(
+    "/api/releases", methods=["GET"], defaults={"dataset_id": DEFAULT_DATASET_ID}
+)
+@api.route("/api/datasets/<int:dataset_id>/releases", methods=["GET"])
+def list_releases(dataset_id):
+    """List label releases of a dataset"""
+    missing = dataset_missing(dataset_id)
+    if missing:
+        return missing
+
+    return jsonify({"releases": releases.list_releases(dataset_id)})
+
+
+@api.route(
+    "/api/releases", methods=["POST"], defaults={"dataset_id": DEFAULT_DATASET_ID}
+)
+@api.route("/api/datasets/<int:dataset_id>/releases", methods=["POST"])
+@limited("export")
+def build_release(dataset_id):
+    """Snapshot the completed labels of a dataset into a new release"""
+    missing = dataset_missing(dataset_id)
+    if missing:
+        return missing
+
+    return jsonify(releases.build_release(dataset_id)), 201
+
+
+@api.route(
+    "/api/releases/<int:version>/labels.arrow",
+    methods=["GET"],
+    defaults={"dataset_id": DEFAULT_DATASET_ID},
+)
+@api.route(
+    "/api/datasets/<int:dataset_id>/releases/<int:version>/labels.arrow",
+    methods=["GET"],
+)
+def download_release(dataset_id, version):
+    """Download the Arrow labels file of a release"""
+    try:
+        path = releases.labels_path(dataset_id, version)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    return send_file(
+        os.path.abspath(path),
+        mimetype="application/vnd.apache.arrow.file",
+        as_attachment=True,
+        download_name=f"dataset{dataset_id}-v{version}.arrow",
+    )
+
+
+@api.route(
+    "/api/releases/diff", methods=["GET"], defaults={"dataset_id": DEFAULT_DATASET_ID}
+)
+@api.route("/api/datasets/<int:dataset_id>/releases/diff", methods=["GET"])
+def diff_releases(dataset_id):
+    """Media added, removed and relabeled between ?from= and ?to= releases"""
+    old_version = request.args.get("from", type=int)
+    new_version = request.args.get("to", type=int)
+    if old_version is None or new_version is None:
+        return jsonify({"error": "from and to versions are required"}), 400
+
+    try:
+        diff = releases.diff_releases(dataset_id, old_version, new_version)
+    except FileNotFoundError as e:
+        return jsonify({"error": str(e)}), 404
+    return jsonify(dict(diff, **{"from": old_version, "to": new_version}))
+
+
 if __name__ == "__main__":
+    initialize()
+
     print("\n" + "=" * 60)
     print("🚀 Markup Tool Backend Started!")
     print("=" * 60)
-    print(f"📁 Upload folder: {os.path.abspath(UPLOAD_FOLDER)}")
+    print(f"🗄️  Storage backend: {media_storage.name}")
+    if media_storage.name == "local":
+        for root in storage.UPLOAD_ROOTS:
+            print(f"📁 Upload folder: {os.path.abspath(root)}")
     print(f"🌐 Application URL: http://localhost:5000")
     print(f"🏥 Health check: http://localhost:5000/api/health")
     print("\n📋 Main API endpoints:")
+    print("  GET  /api/datasets                 - List datasets")
+    print("  POST /api/datasets                 - Create dataset")
+    print("  *    /api/datasets/<id>/...        - Dataset-scoped media/stats/next/")
+    print("                                       prev/scan/reset/export/upload")
     print("  GET  /api/media                    - Get all media")
     print("  GET  /api/stats                   - Get statistics")
     print("  POST /api/annotate                - Submit annotation")
+    print("  PUT  /api/media/<id>/timeline     - Save video traces/segments")
+    print("  GET  /api/media/<id>/timeline     - Get (resampled) video timeline")
+    print("  GET  /api/media/<id>/duplicates   - Find near-duplicate media")
     print("  POST /api/media/upload           - Upload media")
     print("  GET  /api/next                    - Get next unannotated media")
     print("  GET  /api/prev                    - Get previous media")
+    print("  POST /api/priority/import         - Import model uncertainty signals")
+    print("  POST /api/priority/refresh        - Recompute priority scores")
+    print("  POST /api/predictions/import      - Import model predictions")
+    print("  POST /api/view                    - Record a viewed item")
+    print("  POST /api/skip                    - Record a skipped item")
+    print("  GET  /api/analytics/annotators    - Per-annotator throughput")
+    print("  GET  /api/analytics/throughput    - Hourly throughput")
     print("  GET  /api/export                  - Export results")
+    print("  GET  /api/releases                - List label releases")
+    print("  POST /api/releases                - Build a versioned label release")
+    print("  GET  /api/releases/diff           - Diff two releases (?from=&to=)")
     print("  POST /api/scan                   - Scan for new files")
     print("  POST /api/reset                  - Reset annotations")
     print("=" * 60 + "\n")
 
-    # Create uploads directory if it doesn't exist
-    os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
     # Create sample files for demo if none exist
     try:
         from PIL import Image, ImageDraw
@@ -349,9 +1025,9 @@ if __name__ == "__main__":
 
             for i in range(1, 6):
                 filename = f"sample{i}.jpg"
-                filepath = os.path.join(UPLOAD_FOLDER, filename)
+                local_path = media_storage.staging_path(filename)
 
-                if not os.path.exists(filepath):
+                if not os.path.exists(local_path):
                     # Create a simple image with random color
                     colors = [
                         (73, 109, 137),  # Blue-gray
@@ -374,7 +1050,7 @@ if __name__ == "__main__":
                     d.text(
                         (400, 300), text, fill=(255, 255, 255), font=font, anchor="mm"
                     )
-                    img.save(filepath, "JPEG")
+                    img.save(local_path, "JPEG")
                     print(f"✅ Created: {filename}")
 
                 # Add to database if not exists
@@ -382,9 +1058,10 @@ if __name__ == "__main__":
                 if not existing:
                     MarkupResult.create(
                         filename=filename,
-                        filepath=filepath,
+                        filepath=media_storage.commit(filename, local_path),
                         media_type="image",
                         title=f"Sample Image {i}",
+                        metadata=probe_file(local_path),
                     )
 
             print(f"✅ Created {MarkupResult.count()} sample records")
@@ -392,4 +1069,4 @@ if __name__ == "__main__":
         print("⚠️  PIL not installed, skipping sample image creation")
 
     # Run the app
-    app.run(debug=True, port=5000, host="0.0.0.0")
+    create_app().run(debug=True, port=5000, host="0.0.0.0")
@@ -0,0 +1,70 @@
+"""Measure cold-start latency of the backend.
+
+Usage:
+    python bench_startup.py [--runs N] [--importtime]
+
+Each run starts a fresh interpreter that imports app and builds the app
+with create_app(), so the numbers include interpreter startup and module
+imports but no database work. --importtime also prints the slowest
+modules of one run (python -X importtime).
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+STARTUP_CODE = "import app; app.create_app()"
+
+
+def time_startup():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", STARTUP_CODE], cwd=BACKEND_DIR, check=True)
+    return time.perf_counter() - start
+
+
+def slowest_imports(limit=15):
+    """(cumulative microseconds, module) of the slowest direct imports"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", STARTUP_CODE],
+        cwd=BACKEND_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        # Nesting is shown as two spaces per level; keep what app imports directly
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        if depth == 1:
+            timings.append((int(cumulative), module.strip()))
+    return sorted(timings, reverse=True)[:limit]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--importtime", action="store_true")
+    args = parser.parse_args()
+
+    # The first run warms the OS file cache and .pyc files; don't count it
+    time_startup()
+    timings = [time_startup() for _ in range(args.runs)]
+    print(
+        f"⏱️  Startup over {args.runs} runs: "
+        f"min {min(timings) * 1000:.0f} ms, "
+        f"median {statistics.median(timings) * 1000:.0f} ms, "
+        f"max {max(timings) * 1000:.0f} ms"
+    )
+
+    if args.importtime:
+        print("\n📋 Slowest imports:")
+        for cumulative, module in slowest_imports():
+            print(f"  {cumulative / 1000:8.1f} ms  {module}")
@@ -1,8 +1,27 @@
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import Json, RealDictCursor, execute_values
 from contextlib import contextmanager
+import itertools
 import os
+import time
+from contextvars import ContextVar
 from datetime import datetime
+from traces import encode_trace, decode_trace, resample
+from phash import DEFAULT_DISTANCE, HASH_BANDS, MAX_DISTANCE, probe_bands
+from migrations import migrate
+
+
+# Until when reads in the current request must go to the primary
+# (read-your-writes); set from a cookie at the start of each request
+_sticky_until = ContextVar("sticky_until", default=0.0)
+
+
+class VersionConflict(Exception):
+    """A conditional label write lost to a concurrent one"""
+
+    def __init__(self, current):
+        super().__init__(f"Media {current['id']} is at version {current['version']}")
+        self.current = current
 
 
 class Database:
@@ -15,12 +34,92 @@ class Database:
             "port": os.getenv("DB_PORT", "5432"),
         }
 
+        # Read replicas as "host[:port],host[:port]"; same credentials as primary
+        self.replicas = []
+        for replica in filter(None, os.getenv("DB_REPLICA_HOSTS", "").split(",")):
+            host, _, port = replica.strip().partition(":")
+            self.replicas.append(
+                dict(self.db_params, host=host, port=port or self.db_params["port"])
+            )
+        self.replica_state = [
+            {"lag": 0.0, "checked_at": 0.0, "down_until": 0.0} for _ in self.replicas
+        ]
+        self.max_replica_lag = float(os.getenv("DB_REPLICA_MAX_LAG", "5"))
+        self.lag_check_interval = float(os.getenv("DB_REPLICA_CHECK_INTERVAL", "5"))
+        self.sticky_seconds = float(os.getenv("DB_STICKY_SECONDS", "10"))
+        self._next_replica = itertools.count()
+
+    def _replica_lag(self, conn):
+        with conn.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT CASE
+                    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(
+                        EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0
+                    )
+                END
+            """
+            )
+            return float(cursor.fetchone()[0])
+
+    def _connect_replica(self):
+        """Connect to a healthy, caught-up replica or return None"""
+        now = time.time()
+        start = next(self._next_replica)
+        for offset in range(len(self.replicas)):
+            index = (start + offset) % len(self.replicas)
+            state = self.replica_state[index]
+            if state["down_until"] > now:
+                continue
+            if state["lag"] > self.max_replica_lag and (
+                now - state["checked_at"] < self.lag_check_interval
+            ):
+                continue
+
+            try:
+                conn = psycopg2.connect(connect_timeout=2, **self.replicas[index])
+            except psycopg2.OperationalError:
+                state["down_until"] = now + self.lag_check_interval
+                continue
+
+            if now - state["checked_at"] >= self.lag_check_interval:
+                try:
+                    state["lag"] = self._replica_lag(conn)
+                    conn.rollback()
+                except psycopg2.Error:
+                    conn.close()
+                    state["down_until"] = now + self.lag_check_interval
+                    continue
+                state["checked_at"] = now
+                if state["lag"] > self.max_replica_lag:
+                    conn.close()
+                    continue
+            return conn
+        return None
+
+    def stick_to_primary(self):
+        """Route this client's reads to the primary for sticky_seconds"""
+        _sticky_until.set(time.time() + self.sticky_seconds)
+
+    def set_sticky_until(self, timestamp):
+        _sticky_until.set(timestamp)
+
+    def sticky_until(self):
+        return _sticky_until.get()
+
     @contextmanager
-    def get_connection(self):
-        conn = psycopg2.connect(**self.db_params)
+    def get_connection(self, readonly=False):
+        conn = None
+        if readonly and self.replicas and time.time() >= _sticky_until.get():
+            conn = self._connect_replica()
+        if conn is None:
+            conn = psycopg2.connect(**self.db_params)
         try:
             yield conn
             conn.commit()
+            if not readonly:
+                self.stick_to_primary()
         except Exception as e:
             conn.rollback()
             raise e
@@ -28,8 +127,15 @@ class Database:
             conn.close()
 
     @contextmanager
-    def get_cursor(self):
-        with self.get_connection() as conn:
+    def snapshot(self):
+        """Read-only REPEATABLE READ transaction: all queries see one snapshot"""
+        with self.get_connection(readonly=True) as conn:
+            conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+            yield conn
+
+    @contextmanager
+    def get_cursor(self, readonly=False):
+        with self.get_connection(readonly) as conn:
             cursor = conn.cursor(cursor_factory=RealDictCursor)
             try:
                 yield cursor
@@ -38,57 +144,87 @@ class Database:
 
 
 def init_database():
-    """Initialize database with a single markup_results table"""
-    db = Database()
+    """Bring the database schema up to date (see migrations.py)"""
+    applied = migrate(Database())
+    print(f"✅ Database initialized, {len(applied)} migration(s) applied!")
 
-    with db.get_connection() as conn:
-        cursor = conn.cursor()
-
-        # Create single table for markup results
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS markup_results (
-                id SERIAL PRIMARY KEY,
-                filename VARCHAR(255) NOT NULL,
-                filepath VARCHAR(500) NOT NULL,
-                type VARCHAR(10) NOT NULL CHECK (type IN ('image', 'video')),
-                emotion VARCHAR(20) CHECK (emotion IN (
-                    'angry', 'sad', 'neutral', 'happy', 'disgust', 'surprise', 'fear'
-                )),
-                valence DECIMAL(3,2) CHECK (valence >= -1.0 AND valence <= 1.0),
-                arousal DECIMAL(3,2) CHECK (arousal >= -1.0 AND arousal <= 1.0),
-                title VARCHAR(255),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """
-        )
 
-        # Create index for faster queries
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_emotion ON markup_results(emotion)"
-        )
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_filename ON markup_results(filename)"
-        )
-        cursor.execute(
-            "CREATE INDEX IF NOT EXISTS idx_created ON markup_results(created_at DESC)"
-        )
+# Database singleton
+db = Database()
 
-        conn.commit()
+# Media ingested without an explicit dataset lands here (created by migration 8)
+DEFAULT_DATASET_ID = 1
 
-    print("✅ Database initialized with single markup_results table!")
+# Seconds a dataset's cached stats may be served before recomputing
+STATS_CACHE_SECONDS = float(os.getenv("STATS_CACHE_SECONDS", "30"))
 
+# Seconds a priority item handed out by MediaPriority.get_next stays reserved
+PRIORITY_LEASE_SECONDS = int(os.getenv("PRIORITY_LEASE_SECONDS", "600"))
 
-# Database singleton
-db = Database()
+# Columns filled in by the metadata extraction stage
+METADATA_COLUMNS = [
+    "file_size",
+    "width",
+    "height",
+    "duration",
+    "codec",
+    "frame_count",
+    "phash",
+    "dhash",
+] + [f"phash_b{band}" for band in range(HASH_BANDS)]
 
 
-class MarkupResult:
+class Dataset:
     @staticmethod
     def get_all():
-        """Get all markup results"""
+        """Get all datasets with their media counts
+
+        Counts come from the cached dataset stats; only a dataset whose stats
+        were never computed is counted directly.
+        """
+        with db.get_cursor(readonly=True) as cursor:
+            cursor.execute(
+                """
+                SELECT d.*, COALESCE(
+                    (s.stats->>'total_media')::int,
+                    (SELECT COUNT(*) FROM markup_results m WHERE m.dataset_id = d.id)
+                ) AS total_media
+                FROM datasets d
+                LEFT JOIN dataset_stats s ON s.dataset_id = d.id
+                ORDER BY d.id
+            """
+            )
+            return [dict(result) for result in cursor.fetchall()]
+
+    @staticmethod
+    def get_by_id(dataset_id):
+        with db.get_cursor(readonly=True) as cursor:
+            cursor.execute("SELECT * FROM datasets WHERE id = %s", (dataset_id,))
+            result = cursor.fetchone()
+            return dict(result) if result else None
+
+    @staticmethod
+    def create(name, description=None):
+        """Create a dataset; returns None if the name is taken"""
         with db.get_cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO datasets (name, description)
+                VALUES (%s, %s)
+                ON CONFLICT (name) DO NOTHING
+                RETURNING *
+            """,
+                (name, description),
+            )
+            result = cursor.fetchone()
+            return dict(result) if result else None
+
+
+class MarkupResult:
+    @staticmethod
+    def get_all(dataset_id=DEFAULT_DATASET_ID):
+        """Get all markup results of a dataset"""
+        with db.get_cursor(readonly=True) as cursor:
             cursor.execute(
                 """
                 SELECT *, 
@@ -97,8 +233,10 @@ class MarkupResult:
                            ELSE 'completed'
                        END as status
                 FROM markup_results 
+                WHERE dataset_id = %s
                 ORDER BY created_at DESC
-            """
+            """,
+                (dataset_id,),
             )
             results = cursor.fetchall()
 
@@ -108,7 +246,7 @@ class MarkupResult:
     @staticmethod
     def get_by_id(media_id):
         """Get markup result by ID"""
-        with db.get_cursor() as cursor:
+        with db.get_cursor(readonly=True) as cursor:
             cursor.execute(
                 """
                 SELECT *, 
@@ -125,128 +263,400 @@ class MarkupResult:
             return dict(result) if result else None
 
     @staticmethod
-    def get_by_filename(filename):
-        """Get markup result by filename"""
-        with db.get_cursor() as cursor:
+    def get_types(media_ids):
+        """Map the given media ids that exist to their type"""
+        with db.get_cursor(readonly=True) as cursor:
+            cursor.execute(
+                "SELECT id, type FROM markup_results WHERE id = ANY(%s)",
+                (list(media_ids),),
+            )
+            return {row["id"]: row["type"] for row in cursor.fetchall()}
+
+    @staticmethod
+    def get_by_filename(filename, dataset_id=DEFAULT_DATASET_ID):
+        """Get markup result of a dataset by filename"""
+        with db.get_cursor(readonly=True) as cursor:
             cursor.execute(
                 """
                 SELECT * FROM markup_results 
-                WHERE filename = %s
+                WHERE dataset_id = %s AND filename = %s
             """,
-                (filename,),
+                (dataset_id, filename),
             )
             result = cursor.fetchone()
             return dict(result) if result else None
 
     @staticmethod
-    def create(filename, filepath, media_type, title=None):
-        """Create new markup result entry"""
+    def get_existing_filenames(filenames, dataset_id=DEFAULT_DATASET_ID):
+        """Return the subset of filenames already present in a dataset"""
+        if not filenames:
+            return set()
         with db.get_cursor() as cursor:
             cursor.execute(
                 """
-                INSERT INTO markup_results (filename, filepath, type, title)
-                VALUES (%s, %s, %s, %s)
+                SELECT filename FROM markup_results
+                WHERE dataset_id = %s AND filename = ANY(%s)
+            """,
+                (dataset_id, list(filenames)),
+            )
+            return {row["filename"] for row in cursor.fetchall()}
+
+    @staticmethod
+    def create(
+        filename,
+        filepath,
+        media_type,
+        title=None,
+        metadata=None,
+        dataset_id=DEFAULT_DATASET_ID,
+    ):
+        """Create new markup result entry.
+
+        Re-adding a filepath of the same dataset refreshes its metadata;
+        returns None if the filepath belongs to another dataset.
+        """
+        metadata = metadata or {}
+        with db.get_cursor() as cursor:
+            cursor.execute(
+                f"""
+                INSERT INTO markup_results (filename, filepath, type, title, dataset_id,
+                                            {", ".join(METADATA_COLUMNS)})
+                VALUES (%s, %s, %s, %s, %s, {", ".join(["%s"] * len(METADATA_COLUMNS))})
+                ON CONFLICT (filepath) DO UPDATE SET
+                    title = EXCLUDED.title,
+                    {", ".join(f"{c} = EXCLUDED.{c}" for c in METADATA_COLUMNS)}
+                WHERE markup_results.dataset_id = EXCLUDED.dataset_id
                 RETURNING *
             """,
-                (filename, filepath, media_type, title or filename),
+                (filename, filepath, media_type, title or filename, dataset_id)
+                + tuple(metadata.get(column) for column in METADATA_COLUMNS),
             )
             result = cursor.fetchone()
             return dict(result) if result else None
 
     @staticmethod
-    def update_emotion(media_id, emotion, valence=None, arousal=None):
-        """Update emotion and VAD (valence, arousal) for a markup result"""
+    def create_many(items, dataset_id=DEFAULT_DATASET_ID):
+        """Bulk insert entries; each item has filename, filepath, type, title, metadata"""
+        if not items:
+            return []
+        rows = [
+            (
+                item["filename"],
+                item["filepath"],
+                item["type"],
+                item.get("title") or item["filename"],
+                dataset_id,
+            )
+            + tuple((item.get("metadata") or {}).get(c) for c in METADATA_COLUMNS)
+            for item in items
+        ]
         with db.get_cursor() as cursor:
-            # If only emotion is provided, keep existing VAD values
-            if valence is None or arousal is None:
-                cursor.execute(
-                    """
-                    SELECT valence, arousal FROM markup_results WHERE id = %s
-                    """,
-                    (media_id,),
-                )
-                existing = cursor.fetchone()
-                if existing:
-                    valence = valence if valence is not None else existing["valence"]
-                    arousal = arousal if arousal is not None else existing["arousal"]
+            results = execute_values(
+                cursor,
+                f"""
+                INSERT INTO markup_results (filename, filepath, type, title, dataset_id,
+                                            {", ".join(METADATA_COLUMNS)})
+                VALUES %s
+                ON CONFLICT (filepath) DO NOTHING
+                RETURNING *
+            """,
+                rows,
+                fetch=True,
+            )
+            return [dict(result) for result in results]
 
-            cursor.execute(
+    @staticmethod
+    def update_filepaths(paths, dataset_id=DEFAULT_DATASET_ID):
+        """Rewrite filepaths of a dataset in bulk from (filename, filepath) pairs"""
+        if not paths:
+            return 0
+        with db.get_cursor() as cursor:
+            updated = execute_values(
+                cursor,
                 """
-                UPDATE markup_results 
-                SET emotion = %s, valence = %s, arousal = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE id = %s
-                RETURNING *
+                UPDATE markup_results AS m
+                SET filepath = v.filepath
+                FROM (VALUES %s) AS v(filename, filepath, dataset_id)
+                WHERE m.filename = v.filename AND m.filepath <> v.filepath
+                  AND m.dataset_id = v.dataset_id
+                RETURNING m.id
             """,
-                (emotion, valence, arousal, media_id),
+                [(filename, filepath, dataset_id) for filename, filepath in paths],
+                fetch=True,
             )
-            result = cursor.fetchone()
-            return dict(result) if result else None
+            return len(updated)
 
     @staticmethod
-    def update_vad(media_id, valence, arousal):
+    def update_emotion(
+        media_id, emotion, valence=None, arousal=None, expected_version=None
+    ):
+        """Update emotion and VAD (valence, arousal) for a markup result.
+
+        VAD values left as None keep their stored value. With
+        expected_version the write only applies if nobody else labeled the
+        item since; otherwise VersionConflict is raised.
+        """
+        return MarkupResult._update_labels(
+            media_id,
+            {"emotion": emotion, "valence": valence, "arousal": arousal},
+            expected_version,
+        )
+
+    @staticmethod
+    def update_vad(media_id, valence, arousal, expected_version=None):
         """Update only VAD values without changing emotion"""
+        return MarkupResult._update_labels(
+            media_id, {"valence": valence, "arousal": arousal}, expected_version
+        )
+
+    @staticmethod
+    def _update_labels(media_id, labels, expected_version=None):
+        """Single-statement partial label update with an optional version check"""
+        assignments = []
+        params = []
+        for column, value in labels.items():
+            if column == "emotion":
+                assignments.append("emotion = %s")
+            else:
+                assignments.append(f"{column} = COALESCE(%s, {column})")
+            params.append(value)
+        version_check = "AND version = %s" if expected_version is not None else ""
+        params.append(media_id)
+        if expected_version is not None:
+            params.append(expected_version)
+
         with db.get_cursor() as cursor:
             cursor.execute(
-                """
+                f"""
                 UPDATE markup_results 
-                SET valence = %s, arousal = %s, updated_at = CURRENT_TIMESTAMP
-                WHERE id = %s
+                SET {", ".join(assignments)}, label_source = 'human',
+                    version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s {version_check}
                 RETURNING *
             """,
-                (valence, arousal, media_id),
+                params,
+            )
+            result = cursor.fetchone()
+            if result:
+                return dict(result)
+            if expected_version is None:
+                return None
+
+            # Only the failure path pays for telling "gone" from "changed"
+            cursor.execute("SELECT * FROM markup_results WHERE id = %s", (media_id,))
+            current = cursor.fetchone()
+            if current is None:
+                return None
+            raise VersionConflict(dict(current))
+
+    @staticmethod
+    def get_next_unannotated(
+        current_id=0,
+        skip_duplicates=False,
+        dataset_id=DEFAULT_DATASET_ID,
+        max_confidence=None,
+    ):
+        """Get next unannotated media item of a dataset.
+
+        With max_confidence, items the models are already sure about are
+        skipped so humans see the uncertain ones (no prediction counts as 0).
+        """
+        filters = []
+        params = [dataset_id, current_id]
+        if skip_duplicates:
+            filters.append("AND duplicate_of IS NULL")
+        if max_confidence is not None:
+            filters.append("AND COALESCE(model_confidence, 0) < %s")
+            params.append(max_confidence)
+        with db.get_cursor(readonly=True) as cursor:
+            cursor.execute(
+                f"""
+                SELECT * FROM markup_results 
+                WHERE dataset_id = %s AND id > %s
+                  AND (emotion IS NULL OR valence IS NULL OR arousal IS NULL)
+                {" ".join(filters)}
+                ORDER BY id
+                LIMIT 1
+            """,
+                params,
             )
+
             result = cursor.fetchone()
             return dict(result) if result else None
 
     @staticmethod
-    def get_next_unannotated(current_id=0):
-        """Get next unannotated media item"""
+    def _similar(cursor, phash, max_distance, exclude_id, dataset_id):
+        max_distance = min(max_distance, MAX_DISTANCE)
+        unsigned = phash & ((1 << 64) - 1)
+        band_filter = " OR ".join(f"phash_b{i} = ANY(%s)" for i in range(HASH_BANDS))
+        cursor.execute(
+            f"""
+            SELECT *, bit_count((phash # %s)::bit(64)) AS distance
+            FROM markup_results
+            WHERE dataset_id = %s AND ({band_filter})
+              AND bit_count((phash # %s)::bit(64)) <= %s
+              AND id <> %s
+            ORDER BY distance, id
+        """,
+            (
+                phash,
+                dataset_id,
+                *probe_bands(unsigned, max_distance),
+                phash,
+                max_distance,
+                exclude_id or 0,
+            ),
+        )
+        return [dict(result) for result in cursor.fetchall()]
+
+    @staticmethod
+    def find_similar(
+        phash,
+        max_distance=DEFAULT_DISTANCE,
+        exclude_id=None,
+        dataset_id=DEFAULT_DATASET_ID,
+    ):
+        """Find items of a dataset whose pHash is within max_distance bits"""
+        if phash is None:
+            return []
         with db.get_cursor() as cursor:
-            if current_id > 0:
-                cursor.execute(
+            return MarkupResult._similar(
+                cursor, phash, max_distance, exclude_id, dataset_id
+            )
+
+    @staticmethod
+    def cluster_duplicates(media_ids, max_distance=DEFAULT_DISTANCE):
+        """Point each new item at the oldest near-duplicate cluster representative.
+
+        Runs in one transaction; representatives assigned earlier in the batch
+        are tracked locally so later items join the same cluster.
+        """
+        if not media_ids:
+            return 0
+        assigned = {}
+        with db.get_cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT id, phash, dataset_id FROM markup_results
+                WHERE id = ANY(%s) AND phash IS NOT NULL
+                ORDER BY id
+            """,
+                (list(media_ids),),
+            )
+            for row in cursor.fetchall():
+                older = [
+                    item
+                    for item in MarkupResult._similar(
+                        cursor, row["phash"], max_distance, row["id"], row["dataset_id"]
+                    )
+                    if item["id"] < row["id"]
+                ]
+                if older:
+                    assigned[row["id"]] = min(
+                        assigned.get(item["id"], item["duplicate_of"]) or item["id"]
+                        for item in older
+                    )
+            if assigned:
+                execute_values(
+                    cursor,
                     """
-                    SELECT * FROM markup_results 
-                    WHERE id > %s AND (emotion IS NULL OR valence IS NULL OR arousal IS NULL)
-                    ORDER BY id
-                    LIMIT 1
+                    UPDATE markup_results AS m SET duplicate_of = v.representative
+                    FROM (VALUES %s) AS v(id, representative)
+                    WHERE m.id = v.id
                 """,
-                    (current_id,),
+                    list(assigned.items()),
+                    page_size=1000,
                 )
-            else:
-                cursor.execute(
-                    """
-                    SELECT * FROM markup_results 
-                    WHERE emotion IS NULL OR valence IS NULL OR arousal IS NULL
-                    ORDER BY id
-                    LIMIT 1
+        return len(assigned)
+
+    @staticmethod
+    def propagate_to_duplicates(media_id):
+        """Copy the labels of a cluster representative onto its duplicates.
+
+        Duplicates that end up fully labeled leave the priority queue.
+        """
+        with db.get_cursor() as cursor:
+            cursor.execute(
                 """
+                WITH propagated AS (
+                    UPDATE markup_results AS d
+                    SET emotion = r.emotion, valence = r.valence, arousal = r.arousal,
+                        version = d.version + 1, updated_at = CURRENT_TIMESTAMP
+                    FROM markup_results AS r
+                    WHERE r.id = %s AND d.duplicate_of = r.id
+                      AND d.dataset_id = r.dataset_id
+                    RETURNING d.id, d.emotion, d.valence, d.arousal
+                ),
+                dequeued AS (
+                    UPDATE media_priority p
+                    SET pending = FALSE, leased_until = NULL
+                    FROM propagated
+                    WHERE p.media_id = propagated.id
+                      AND propagated.emotion IS NOT NULL
+                      AND propagated.valence IS NOT NULL
+                      AND propagated.arousal IS NOT NULL
                 )
-
-            result = cursor.fetchone()
-            return dict(result) if result else None
+                SELECT COUNT(*) AS propagated FROM propagated
+            """,
+                (media_id,),
+            )
+            return cursor.fetchone()["propagated"]
 
     @staticmethod
-    def get_previous(current_id):
-        """Get previous media item"""
-        with db.get_cursor() as cursor:
+    def get_previous(current_id, dataset_id=DEFAULT_DATASET_ID):
+        """Get previous media item of a dataset"""
+        with db.get_cursor(readonly=True) as cursor:
             cursor.execute(
                 """
                 SELECT * FROM markup_results 
-                WHERE id < %s
+                WHERE dataset_id = %s AND id < %s
                 ORDER BY id DESC
                 LIMIT 1
             """,
-                (current_id,),
+                (dataset_id, current_id),
             )
             result = cursor.fetchone()
             return dict(result) if result else None
 
     @staticmethod
-    def get_stats():
-        """Get statistics about markup results"""
+    def get_stats(dataset_id=DEFAULT_DATASET_ID, max_age=STATS_CACHE_SECONDS):
+        """Get statistics of a dataset, served from dataset_stats if fresh enough"""
+        if max_age > 0:
+            with db.get_cursor(readonly=True) as cursor:
+                cursor.execute(
+                    """
+                    SELECT stats FROM dataset_stats
+                    WHERE dataset_id = %s
+                      AND computed_at > CURRENT_TIMESTAMP - make_interval(secs => %s)
+                """,
+                    (dataset_id, max_age),
+                )
+                cached = cursor.fetchone()
+            if cached:
+                return cached["stats"]
+
+        stats = MarkupResult.compute_stats(dataset_id)
         with db.get_cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO dataset_stats (dataset_id, stats, computed_at)
+                VALUES (%s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (dataset_id) DO UPDATE SET
+                    stats = EXCLUDED.stats, computed_at = EXCLUDED.computed_at
+            """,
+                (dataset_id, Json(stats)),
+            )
+        return stats
+
+    @staticmethod
+    def compute_stats(dataset_id=DEFAULT_DATASET_ID):
+        """Compute statistics about the markup results of a dataset"""
+        with db.get_cursor(readonly=True) as cursor:
             # Get total count
-            cursor.execute("SELECT COUNT(*) as total FROM markup_results")
+            cursor.execute(
+                "SELECT COUNT(*) as total FROM markup_results WHERE dataset_id = %s",
+                (dataset_id,),
+            )
             total = cursor.fetchone()["total"]
 
             # Get fully annotated count (all three fields)
@@ -254,8 +664,10 @@ class MarkupResult:
                 """
                 SELECT COUNT(*) as annotated 
                 FROM markup_results 
-                WHERE emotion IS NOT NULL AND valence IS NOT NULL AND arousal IS NOT NULL
-                """
+                WHERE dataset_id = %s
+                  AND emotion IS NOT NULL AND valence IS NOT NULL AND arousal IS NOT NULL
+                """,
+                (dataset_id,),
             )
             annotated = cursor.fetchone()["annotated"]
 
@@ -264,10 +676,11 @@ class MarkupResult:
                 """
                 SELECT emotion, COUNT(*) as count 
                 FROM markup_results 
-                WHERE emotion IS NOT NULL 
+                WHERE dataset_id = %s AND emotion IS NOT NULL 
                 GROUP BY emotion 
                 ORDER BY count DESC
-            """
+            """,
+                (dataset_id,),
             )
             emotion_dist = cursor.fetchall()
 
@@ -279,9 +692,11 @@ class MarkupResult:
                 """
                 SELECT type, COUNT(*) as count 
                 FROM markup_results 
+                WHERE dataset_id = %s
                 GROUP BY type 
                 ORDER BY type
-            """
+            """,
+                (dataset_id,),
             )
             type_dist = cursor.fetchall()
             type_summary = {row["type"]: row["count"] for row in type_dist}
@@ -295,10 +710,15 @@ class MarkupResult:
                     ROUND(STDDEV(valence)::numeric, 2) as std_valence,
                     ROUND(STDDEV(arousal)::numeric, 2) as std_arousal
                 FROM markup_results 
-                WHERE valence IS NOT NULL AND arousal IS NOT NULL
-                """
+                WHERE dataset_id = %s AND valence IS NOT NULL AND arousal IS NOT NULL
+                """,
+                (dataset_id,),
             )
             vad_stats = cursor.fetchone()
+            vad_summary = {
+                key: str(value) if value is not None else None
+                for key, value in (vad_stats or {}).items()
+            }
 
             return {
                 "total_media": total,
@@ -307,54 +727,475 @@ class MarkupResult:
                 "completion_rate": (annotated / total * 100) if total > 0 else 0,
                 "emotion_summary": emotion_summary,
                 "type_summary": type_summary,
-                "vad_summary": dict(vad_stats) if vad_stats else {},
+                "vad_summary": vad_summary,
             }
 
     @staticmethod
-    def count():
-        """Count total records"""
-        with db.get_cursor() as cursor:
-            cursor.execute("SELECT COUNT(*) as count FROM markup_results")
+    def count(dataset_id=DEFAULT_DATASET_ID):
+        """Count records of a dataset"""
+        with db.get_cursor(readonly=True) as cursor:
+            cursor.execute(
+                "SELECT COUNT(*) as count FROM markup_results WHERE dataset_id = %s",
+                (dataset_id,),
+            )
             return cursor.fetchone()["count"]
 
     @staticmethod
-    def reset_annotations():
-        """Reset all annotations (set emotion, valence, arousal to NULL)"""
+    def reset_annotations(dataset_id=DEFAULT_DATASET_ID):
+        """Reset annotations of one dataset (set emotion, valence, arousal to NULL)"""
         with db.get_cursor() as cursor:
             cursor.execute(
                 """
                 UPDATE markup_results 
-                SET emotion = NULL, valence = NULL, arousal = NULL, updated_at = CURRENT_TIMESTAMP
-            """
+                SET emotion = NULL, valence = NULL, arousal = NULL, label_source = 'human',
+                    version = version + 1, updated_at = CURRENT_TIMESTAMP
+                WHERE dataset_id = %s
+                  AND (emotion IS NOT NULL OR valence IS NOT NULL OR arousal IS NOT NULL)
+            """,
+                (dataset_id,),
             )
             return cursor.rowcount
 
     @staticmethod
-    def get_unannotated(limit=None):
-        """Get unannotated media items"""
-        with db.get_cursor() as cursor:
+    def get_unannotated(limit=None, dataset_id=DEFAULT_DATASET_ID):
+        """Get unannotated media items of a dataset"""
+        with db.get_cursor(readonly=True) as cursor:
             query = """
                 SELECT * FROM markup_results 
-                WHERE emotion IS NULL OR valence IS NULL OR arousal IS NULL 
+                WHERE dataset_id = %s
+                  AND (emotion IS NULL OR valence IS NULL OR arousal IS NULL)
                 ORDER BY id
             """
             if limit:
-                cursor.execute(f"{query} LIMIT %s", (limit,))
+                cursor.execute(f"{query} LIMIT %s", (dataset_id, limit))
             else:
-                cursor.execute(query)
+                cursor.execute(query, (dataset_id,))
             results = cursor.fetchall()
             return [dict(result) for result in results]
 
     @staticmethod
-    def get_annotated():
-        """Get annotated media items"""
-        with db.get_cursor() as cursor:
+    def get_annotated(dataset_id=DEFAULT_DATASET_ID):
+        """Get annotated media items of a dataset"""
+        with db.get_cursor(readonly=True) as cursor:
             cursor.execute(
                 """
                 SELECT * FROM markup_results 
-                WHERE emotion IS NOT NULL AND valence IS NOT NULL AND arousal IS NOT NULL 
+                WHERE dataset_id = %s
+                  AND emotion IS NOT NULL AND valence IS NOT NULL AND arousal IS NOT NULL 
                 ORDER BY updated_at DESC
-                """
+                """,
+                (dataset_id,),
             )
             results = cursor.fetchall()
             return [dict(result) for result in results]
+
+
+class VideoAnnotation:
+    @staticmethod
+    def _write_traces(cursor, traces):
+        rows = [
+            (
+                trace["media_id"],
+                trace["dimension"],
+                trace["sample_rate"],
+                trace.get("start_time", 0),
+                len(trace["values"]),
+                psycopg2.Binary(encode_trace(trace["values"])),
+            )
+            for trace in traces
+        ]
+        execute_values(
+            cursor,
+            """
+            INSERT INTO video_traces
+                (media_id, dimension, sample_rate, start_time, sample_count, data)
+            VALUES %s
+            ON CONFLICT (media_id, dimension) DO UPDATE SET
+                sample_rate = EXCLUDED.sample_rate,
+                start_time = EXCLUDED.start_time,
+                sample_count = EXCLUDED.sample_count,
+                data = EXCLUDED.data,
+                updated_at = CURRENT_TIMESTAMP
+        """,
+            rows,
+        )
+        return len(rows)
+
+    @staticmethod
+    def _write_segments(cursor, media_id, segments):
+        cursor.execute(
+            "DELETE FROM video_emotion_segments WHERE media_id = %s", (media_id,)
+        )
+        if segments:
+            execute_values(
+                cursor,
+                """
+                INSERT INTO video_emotion_segments
+                    (media_id, start_time, end_time, emotion)
+                VALUES %s
+            """,
+                [(media_id, s["start"], s["end"], s["emotion"]) for s in segments],
+            )
+        return len(segments)
+
+    @staticmethod
+    def save_traces(traces):
+        """Upsert traces in bulk.
+
+        Each trace is a dict with media_id, dimension, sample_rate,
+        start_time and values; values are stored delta-encoded.
+        """
+        if not traces:
+            return 0
+        with db.get_cursor() as cursor:
+            return VideoAnnotation._write_traces(cursor, traces)
+
+    @staticmethod
+    def save_segments(media_id, segments):
+        """Replace all emotion segments of a video"""
+        with db.get_cursor() as cursor:
+            return VideoAnnotation._write_segments(cursor, media_id, segments)
+
+    @staticmethod
+    def save_timelines(traces, segments):
+        """Upsert traces and replace segments ({media_id: segments}) in one transaction"""
+        with db.get_cursor() as cursor:
+            saved = VideoAnnotation._write_traces(cursor, traces) if traces else 0
+            for media_id, media_segments in segments.items():
+                VideoAnnotation._write_segments(cursor, media_id, media_segments)
+            return saved
+
+    @staticmethod
+    def get_traces(media_id, resolution=None):
+        """Get decoded traces for a video, optionally resampled to resolution Hz"""
+        with db.get_cursor(readonly=True) as cursor:
+            cursor.execute(
+                """
+                SELECT dimension, sample_rate, start_time, sample_count, data
+                FROM video_traces
+                WHERE media_id = %s
+            """,
+                (media_id,),
+            )
+            rows = cursor.fetchall()
+
+        traces = {}
+        for row in rows:
+            values = decode_trace(row["data"])
+            rate = row["sample_rate"]
+            if resolution:
+                values = resample(values, rate, resolution)
+                rate = resolution
+            traces[row["dimension"]] = {
+                "sample_rate": rate,
+                "start_time": row["start_time"],
+                "source_sample_count": row["sample_count"],
+                "values": values,
+            }
+        return traces
+
+    @staticmethod
+    def get_segments(media_id):
+        """Get emotion segments of a video ordered by start time"""
+        with db.get_cursor(readonly=True) as cursor:
+            cursor.execute(
+                """
+                SELECT start_time, end_time, emotion
+                FROM video_emotion_segments
+                WHERE media_id = %s
+                ORDER BY start_time
+            """,
+                (media_id,),
+            )
+            return [
+                {
+                    "start": row["start_time"],
+                    "end": row["end_time"],
+                    "emotion": row["emotion"],
+                }
+                for row in cursor.fetchall()
+            ]
+
+
+class MediaPriority:
+    @staticmethod
+    def import_signals(items):
+        """Upsert uncertainty/disagreement/predicted emotion signals in bulk.
+
+        Returns the ids of the media that got signals.
+        """
+        if not items:
+            return []
+        rows = [
+            (
+                item["media_id"],
+                item.get("uncertainty"),
+                item.get("disagreement"),
+                item.get("predicted_emotion"),
+            )
+            for item in items
+        ]
+        with db.get_cursor() as cursor:
+            imported = execute_values(
+                cursor,
+                """
+                INSERT INTO media_priority
+                    (media_id, dataset_id, uncertainty, disagreement, predicted_emotion,
+                     pending)
+                SELECT v.media_id, m.dataset_id, v.uncertainty, v.disagreement,
+                       v.predicted_emotion,
+                       (m.emotion IS NULL OR m.valence IS NULL OR m.arousal IS NULL)
+                FROM (VALUES %s) AS v(media_id, uncertainty, disagreement, predicted_emotion)
+                JOIN markup_results m ON m.id = v.media_id
+                ON CONFLICT (media_id) DO UPDATE SET
+                    uncertainty = COALESCE(EXCLUDED.uncertainty, media_priority.uncertainty),
+                    disagreement = COALESCE(EXCLUDED.disagreement, media_priority.disagreement),
+                    predicted_emotion = COALESCE(
+                        EXCLUDED.predicted_emotion, media_priority.predicted_emotion
+                    ),
+                    updated_at = CURRENT_TIMESTAMP
+                RETURNING media_id
+            """,
+                rows,
+                template="(%s::integer, %s::real, %s::real, %s::varchar)",
+                fetch=True,
+            )
+            return [row["media_id"] for row in imported]
+
+    @staticmethod
+    def get_batch(after_id, limit, media_ids=None):
+        """Get a keyset-paginated batch of priority rows, optionally only media_ids"""
+        only = "AND media_id = ANY(%s)" if media_ids is not None else ""
+        params = [after_id] + ([list(media_ids)] if media_ids is not None else [])
+        with db.get_cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT media_id, dataset_id, uncertainty, disagreement, predicted_emotion
+                FROM media_priority
+                WHERE media_id > %s {only}
+                ORDER BY media_id
+                LIMIT %s
+            """,
+                params + [limit],
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def update_scores(scores):
+        """Write (media_id, score) pairs back in one statement"""
+        with db.get_cursor() as cursor:
+            execute_values(
+                cursor,
+                """
+                UPDATE media_priority AS p
+                SET score = v.score, updated_at = CURRENT_TIMESTAMP
+                FROM (VALUES %s) AS v(media_id, score)
+                WHERE p.media_id = v.media_id
+            """,
+                scores,
+                template="(%s::integer, %s::double precision)",
+                page_size=1000,
+            )
+
+    @staticmethod
+    def mark_done(media_id):
+        """Drop an item from the pending queue once fully annotated"""
+        with db.get_cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE media_priority SET pending = FALSE, leased_until = NULL
+                WHERE media_id = %s
+            """,
+                (media_id,),
+            )
+
+    @staticmethod
+    def mark_all_pending(dataset_id=DEFAULT_DATASET_ID):
+        """Put every item of a dataset back in the queue (used after a reset)"""
+        with db.get_cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE media_priority SET pending = TRUE, leased_until = NULL
+                WHERE dataset_id = %s AND (NOT pending OR leased_until IS NOT NULL)
+            """,
+                (dataset_id,),
+            )
+
+    @staticmethod
+    def get_next(
+        current_id=0,
+        dataset_id=DEFAULT_DATASET_ID,
+        skip_duplicates=False,
+        max_confidence=None,
+    ):
+        """Lease the highest-priority pending item of a dataset, skipping current_id.
+
+        The item is handed out for PRIORITY_LEASE_SECONDS, so skipping it moves
+        on down the queue instead of bouncing back, and concurrent annotators
+        get different items. skip_duplicates and max_confidence filter like
+        get_next_unannotated.
+        """
+        filters = []
+        params = [dataset_id, current_id]
+        if skip_duplicates:
+            filters.append("AND m.duplicate_of IS NULL")
+        if max_confidence is not None:
+            filters.append("AND COALESCE(m.model_confidence, 0) < %s")
+            params.append(max_confidence)
+        with db.get_cursor() as cursor:
+            cursor.execute(
+                f"""
+                WITH candidate AS (
+                    SELECT p.media_id
+                    FROM media_priority p
+                    JOIN markup_results m ON m.id = p.media_id
+                    WHERE p.dataset_id = %s AND p.pending AND p.media_id <> %s
+                      AND (p.leased_until IS NULL
+                           OR p.leased_until < CURRENT_TIMESTAMP)
+                    {" ".join(filters)}
+                    ORDER BY p.score DESC, p.media_id
+                    LIMIT 1
+                    FOR UPDATE OF p SKIP LOCKED
+                ),
+                leased AS (
+                    UPDATE media_priority p
+                    SET leased_until = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                    FROM candidate
+                    WHERE p.media_id = candidate.media_id
+                    RETURNING p.media_id, p.score
+                )
+                SELECT m.*, leased.score AS priority
+                FROM leased
+                JOIN markup_results m ON m.id = leased.media_id
+            """,
+                params + [PRIORITY_LEASE_SECONDS],
+            )
+            result = cursor.fetchone()
+            return dict(result) if result else None
+
+
+class AnnotationEvent:
+    @staticmethod
+    def insert_batch(events):
+        """Append events and fold them into the hourly rollups in one transaction.
+
+        Each event is a dict with annotator, session_id, dataset_id, media_id,
+        event_type, duration_ms and created_at (a datetime).
+        """
+        if not events:
+            return 0
+
+        rollups = {}
+        for event in events:
+            hour = event["created_at"].replace(minute=0, second=0, microsecond=0)
+            key = (event["annotator"], event["dataset_id"] or DEFAULT_DATASET_ID, hour)
+            row = rollups.setdefault(
+                key, {"view": 0, "annotate": 0, "skip": 0, "ms": 0, "timed": 0}
+            )
+            row[event["event_type"]] += 1
+            if event["event_type"] != "view" and event["duration_ms"] is not None:
+                row["ms"] += event["duration_ms"]
+                row["timed"] += 1
+
+        with db.get_cursor() as cursor:
+            execute_values(
+                cursor,
+                """
+                INSERT INTO annotation_events
+                    (annotator, session_id, dataset_id, media_id, event_type,
+                     duration_ms, created_at)
+                VALUES %s
+            """,
+                [
+                    (
+                        event["annotator"],
+                        event["session_id"],
+                        event["dataset_id"],
+                        event["media_id"],
+                        event["event_type"],
+                        event["duration_ms"],
+                        event["created_at"],
+                    )
+                    for event in events
+                ],
+                page_size=1000,
+            )
+            execute_values(
+                cursor,
+                """
+                INSERT INTO annotator_hourly_stats AS s
+                    (annotator, dataset_id, hour, views, annotations, skips,
+                     time_on_item_ms, timed_items)
+                VALUES %s
+                ON CONFLICT (annotator, dataset_id, hour) DO UPDATE SET
+                    views = s.views + EXCLUDED.views,
+                    annotations = s.annotations + EXCLUDED.annotations,
+                    skips = s.skips + EXCLUDED.skips,
+                    time_on_item_ms = s.time_on_item_ms + EXCLUDED.time_on_item_ms,
+                    timed_items = s.timed_items + EXCLUDED.timed_items
+            """,
+                [
+                    (
+                        annotator,
+                        dataset_id,
+                        hour,
+                        r["view"],
+                        r["annotate"],
+                        r["skip"],
+                        r["ms"],
+                        r["timed"],
+                    )
+                    for (annotator, dataset_id, hour), r in rollups.items()
+                ],
+            )
+        return len(events)
+
+    @staticmethod
+    def get_annotator_summary(since, dataset_id=None):
+        """Per-annotator throughput from the hourly rollups"""
+        dataset_filter = "AND dataset_id = %s" if dataset_id else ""
+        params = (since, dataset_id) if dataset_id else (since,)
+        with db.get_cursor(readonly=True) as cursor:
+            cursor.execute(
+                f"""
+                SELECT annotator,
+                       SUM(annotations) AS annotations,
+                       SUM(skips) AS skips,
+                       SUM(views) AS views,
+                       COUNT(DISTINCT hour) AS active_hours,
+                       ROUND(
+                           SUM(annotations)::numeric / COUNT(DISTINCT hour), 2
+                       ) AS annotations_per_hour,
+                       ROUND(
+                           SUM(time_on_item_ms)::numeric
+                           / NULLIF(SUM(timed_items), 0) / 1000, 2
+                       ) AS avg_seconds_per_item
+                FROM annotator_hourly_stats
+                WHERE hour >= %s {dataset_filter}
+                GROUP BY annotator
+                ORDER BY annotations DESC
+            """,
+                params,
+            )
+            return [dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def get_hourly_throughput(since, dataset_id=None):
+        """Annotations, skips and active annotators per hour"""
+        dataset_filter = "AND dataset_id = %s" if dataset_id else ""
+        params = (since, dataset_id) if dataset_id else (since,)
+        with db.get_cursor(readonly=True) as cursor:
+            cursor.execute(
+                f"""
+                SELECT hour,
+                       SUM(annotations) AS annotations,
+                       SUM(skips) AS skips,
+                       COUNT(DISTINCT annotator) AS annotators
+                FROM annotator_hourly_stats
+                WHERE hour >= %s {dataset_filter}
+                GROUP BY hour
+                ORDER BY hour
+            """,
+                params,
+            )
+            return [dict(row) for row in cursor.fetchall()]
@@ -0,0 +1,109 @@
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+
+from database import AnnotationEvent
+
+# Flush when this many events are buffered, or every FLUSH_INTERVAL seconds
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 2.0
+
+# Events beyond this are dropped rather than letting memory grow unbounded
+MAX_BUFFERED = 50_000
+
+# Longer gaps are treated as the annotator walking away, not time on item
+MAX_TIME_ON_ITEM_MS = 10 * 60 * 1000
+
+
+class EventWriter:
+    """Buffers annotator events and writes them in batches from a background thread"""
+
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=MAX_BUFFERED)
+        self.dropped = 0
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="event-writer", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.flush)
+
+    def record(
+        self,
+        event_type,
+        annotator,
+        media_id=None,
+        dataset_id=None,
+        session_id=None,
+        duration_ms=None,
+    ):
+        """Queue an event; never blocks the request"""
+        try:
+            duration_ms = max(0, min(int(duration_ms), MAX_TIME_ON_ITEM_MS))
+        except (TypeError, ValueError, OverflowError):
+            # Timing is best effort; a bad value must not fail the request
+            duration_ms = None
+        event = {
+            "annotator": annotator,
+            "session_id": session_id,
+            "dataset_id": dataset_id,
+            "media_id": media_id,
+            "event_type": event_type,
+            "duration_ms": duration_ms,
+            "created_at": datetime.now(),
+        }
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def _drain(self, limit):
+        events = []
+        while len(events) < limit:
+            try:
+                events.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def flush(self):
+        """Write everything currently buffered"""
+        while True:
+            events = self._drain(self.batch_size)
+            if not events:
+                return
+            try:
+                AnnotationEvent.insert_batch(events)
+            except Exception as e:
+                print(f"⚠️  Dropped {len(events)} annotation events: {e}")
+
+    def _run(self):
+        while True:
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            # Let a batch accumulate briefly before writing it
+            events = [first] + self._drain(self.batch_size - 1)
+            try:
+                AnnotationEvent.insert_batch(events)
+            except Exception as e:
+                print(f"⚠️  Dropped {len(events)} annotation events: {e}")
+            if len(events) < self.batch_size:
+                time.sleep(self.flush_interval)
+
+
+# Event writer singleton
+event_writer = EventWriter()
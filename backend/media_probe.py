@@ -0,0 +1,234 @@
+import multiprocessing
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from phash import HASH_BANDS, image_hashes
+
+VIDEO_EXTENSIONS = {"mp4", "avi", "mov"}
+
+# Boxes we descend into when looking for track metadata in mp4/mov files
+MP4_CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl"}
+
+# Below this many files a process pool costs more than it saves
+POOL_THRESHOLD = 4
+
+# Pool workers start from a clean server process instead of a fork of the
+# caller: forking a threaded Flask worker can copy a lock some other thread
+# holds into the child, which then deadlocks on it
+POOL_START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def media_type_for(filename):
+    """Guess media type from the file extension"""
+    ext = filename.rsplit(".", 1)[-1].lower()
+    return "video" if ext in VIDEO_EXTENSIONS else "image"
+
+
+def empty_metadata():
+    metadata = {
+        "file_size": None,
+        "width": None,
+        "height": None,
+        "duration": None,
+        "codec": None,
+        "frame_count": None,
+        "phash": None,
+        "dhash": None,
+    }
+    for i in range(HASH_BANDS):
+        metadata[f"phash_b{i}"] = None
+    return metadata
+
+
+def probe_image(filepath):
+    """Read image dimensions and format with Pillow and hash the pixels"""
+    from PIL import Image
+
+    metadata = empty_metadata()
+    with Image.open(filepath) as img:
+        metadata["width"], metadata["height"] = img.size
+        metadata["codec"] = (img.format or "").lower() or None
+        metadata["frame_count"] = getattr(img, "n_frames", 1)
+        metadata.update(image_hashes(img))
+    return metadata
+
+
+def _iter_boxes(data, start=0, end=None):
+    """Yield (type, payload_start, payload_end) for boxes in an in-memory buffer"""
+    end = len(data) if end is None else end
+    offset = start
+    while offset + 8 <= end:
+        size, box_type = struct.unpack_from(">I4s", data, offset)
+        header = 8
+        if size == 1:
+            if offset + 16 > end:
+                return
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield box_type, offset + header, min(offset + size, end)
+        offset += size
+
+
+def _read_moov(f):
+    """Seek over top-level boxes and return the raw moov payload"""
+    f.seek(0, os.SEEK_END)
+    file_end = f.tell()
+    offset = 0
+    while offset + 8 <= file_end:
+        f.seek(offset)
+        header = f.read(16)
+        size, box_type = struct.unpack_from(">I4s", header)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", header, 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = file_end - offset
+        if size < header_size:
+            return None
+        if box_type == b"moov":
+            f.seek(offset + header_size)
+            return f.read(size - header_size)
+        offset += size
+    return None
+
+
+def _parse_trak(data, start, end, track):
+    for box_type, body, box_end in _iter_boxes(data, start, end):
+        if box_type in MP4_CONTAINER_BOXES:
+            _parse_trak(data, body, box_end, track)
+        elif box_type == b"tkhd":
+            version = data[body]
+            offset = body + (88 if version == 1 else 76)
+            if offset + 8 <= box_end:
+                width, height = struct.unpack_from(">II", data, offset)
+                track["width"] = width >> 16
+                track["height"] = height >> 16
+        elif box_type == b"mdhd":
+            version = data[body]
+            if version == 1:
+                timescale, duration = struct.unpack_from(">IQ", data, body + 20)
+            else:
+                timescale, duration = struct.unpack_from(">II", data, body + 12)
+            if timescale:
+                track["duration"] = duration / timescale
+        elif box_type == b"hdlr":
+            track["handler"] = data[body + 8 : body + 12]
+        elif box_type == b"stsd":
+            if body + 16 <= box_end:
+                track["codec"] = data[body + 12 : body + 16].decode("latin-1")
+        elif box_type == b"stsz":
+            if body + 12 <= box_end:
+                track["frame_count"] = struct.unpack_from(">I", data, body + 8)[0]
+
+
+def probe_mp4(filepath):
+    """Parse mp4/mov container headers (mvhd, tkhd, mdhd, stsd, stsz)"""
+    metadata = empty_metadata()
+    with open(filepath, "rb") as f:
+        moov = _read_moov(f)
+    if not moov:
+        return metadata
+
+    for box_type, body, box_end in _iter_boxes(moov):
+        if box_type == b"mvhd":
+            version = moov[body]
+            if version == 1:
+                timescale, duration = struct.unpack_from(">IQ", moov, body + 20)
+            else:
+                timescale, duration = struct.unpack_from(">II", moov, body + 12)
+            if timescale:
+                metadata["duration"] = duration / timescale
+        elif box_type == b"trak":
+            track = {}
+            _parse_trak(moov, body, box_end, track)
+            if track.get("handler") != b"vide":
+                continue
+            for key in ("width", "height", "codec", "frame_count"):
+                if track.get(key) is not None:
+                    metadata[key] = track[key]
+            if metadata["duration"] is None:
+                metadata["duration"] = track.get("duration")
+    return metadata
+
+
+def probe_avi(filepath):
+    """Parse the RIFF/AVI main header (avih) and video stream header (strh)"""
+    metadata = empty_metadata()
+    with open(filepath, "rb") as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"AVI ":
+            return metadata
+        list_header = f.read(12)
+        if len(list_header) < 12 or list_header[:4] != b"LIST":
+            return metadata
+        size = struct.unpack_from("<I", list_header, 4)[0]
+        if list_header[8:12] != b"hdrl":
+            return metadata
+        hdrl = f.read(size - 4)
+
+    offset = 0
+    while offset + 8 <= len(hdrl):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", hdrl, offset)
+        body = offset + 8
+        if chunk_id == b"LIST":
+            # Descend into strl lists: skip only the list type
+            offset = body + 4
+            continue
+        if chunk_id == b"avih" and chunk_size >= 40:
+            usec_per_frame, _, _, _, total_frames = struct.unpack_from(
+                "<5I", hdrl, body
+            )
+            width, height = struct.unpack_from("<II", hdrl, body + 32)
+            metadata["width"] = width
+            metadata["height"] = height
+            metadata["frame_count"] = total_frames
+            if usec_per_frame:
+                metadata["duration"] = total_frames * usec_per_frame / 1_000_000
+        elif chunk_id == b"strh" and chunk_size >= 8:
+            fcc_type, handler = struct.unpack_from("<4s4s", hdrl, body)
+            if fcc_type == b"vids":
+                metadata["codec"] = handler.decode("latin-1").strip("\x00 ") or None
+        offset = body + chunk_size + (chunk_size & 1)
+    return metadata
+
+
+def probe_file(filepath):
+    """Extract media metadata for a single file, never raising on bad input"""
+    ext = filepath.rsplit(".", 1)[-1].lower()
+    try:
+        if ext == "avi":
+            metadata = probe_avi(filepath)
+        elif ext in VIDEO_EXTENSIONS:
+            metadata = probe_mp4(filepath)
+        else:
+            metadata = probe_image(filepath)
+    except Exception as e:
+        print(f"⚠️  Could not probe {filepath}: {e}")
+        metadata = empty_metadata()
+
+    try:
+        metadata["file_size"] = os.path.getsize(filepath)
+    except OSError:
+        pass
+    return metadata
+
+
+def probe_files(filepaths, max_workers=None):
+    """Probe many files using all cores; returns metadata in input order"""
+    filepaths = list(filepaths)
+    if len(filepaths) < POOL_THRESHOLD:
+        return [probe_file(path) for path in filepaths]
+
+    workers = max_workers or os.cpu_count() or 1
+    chunksize = max(1, len(filepaths) // (workers * 4))
+    context = multiprocessing.get_context(POOL_START_METHOD)
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        return list(pool.map(probe_file, filepaths, chunksize=chunksize))
@@ -0,0 +1,68 @@
+"""Move upload files into the sharded layout and rewrite DB filepaths.
+
+Usage:
+    python migrate_uploads.py [--dry-run] [--batch-size N]
+
+Files are moved first, then markup_results.filepath is rewritten in bulk
+for every file found, one batch per transaction. Re-running is safe:
+files already in their shard are not moved again, but their rows are
+still resynced in case a previous run stopped between move and update.
+Only the default dataset's tree is migrated: other datasets have always
+been stored sharded under datasets/<id>/.
+"""
+
+import argparse
+import os
+import shutil
+
+import storage
+from database import MarkupResult
+
+
+def move(source, target):
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    try:
+        os.replace(source, target)
+    except OSError:
+        # Different disk: copy across volumes, then drop the source
+        shutil.move(source, target)
+
+
+def migrate(batch_size=1000, dry_run=False):
+    moved = 0
+    updated = 0
+    batch = []
+
+    for filename, source in storage.iter_files():
+        target = storage.path_for(filename)
+        if os.path.normpath(source) != os.path.normpath(target):
+            if dry_run:
+                print(f"{source} -> {target}")
+            else:
+                move(source, target)
+            moved += 1
+
+        if not dry_run:
+            batch.append((filename, target))
+
+        if len(batch) >= batch_size:
+            updated += MarkupResult.update_filepaths(batch)
+            batch = []
+
+    if batch:
+        updated += MarkupResult.update_filepaths(batch)
+
+    return moved, updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    moved, updated = migrate(args.batch_size, args.dry_run)
+    if args.dry_run:
+        print(f"📝 {moved} files would be moved")
+    else:
+        print(f"✅ Moved {moved} files, updated {updated} database rows")
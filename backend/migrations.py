@@ -0,0 +1,622 @@
+"""Versioned schema migrations for the markup backend.
+
+Usage:
+    python migrations.py           # apply pending migrations
+    python migrations.py status    # list applied and pending migrations
+
+Each migration runs once, in version order, and is recorded in
+schema_migrations. Transactional migrations commit atomically with their
+bookkeeping row. Non-transactional ones run in autocommit so they can use
+CREATE INDEX CONCURRENTLY on large tables without blocking writes; a
+concurrent build that failed half way leaves an INVALID index, which is
+dropped and rebuilt on the next run rather than recorded as done. An
+advisory lock keeps several workers from migrating at the same time.
+Never edit a migration that has shipped; append a new one instead.
+"""
+
+import re
+import sys
+
+from phash import HASH_BANDS
+
+# Frozen copy of app.EMOTIONS: shipped migrations must not change with the app
+EMOTIONS = ["angry", "sad", "neutral", "happy", "disgust", "surprise", "fear"]
+
+# Arbitrary key for pg_advisory_lock, shared by every migrating process
+MIGRATION_LOCK_ID = 7_318_224
+
+# Indexes built by non-transactional migrations, checked for validity
+CONCURRENT_INDEX = re.compile(
+    r"CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+(\w+)",
+    re.IGNORECASE,
+)
+
+# Predicate shared by the pending-queue queries in database.py
+PENDING = "(emotion IS NULL OR valence IS NULL OR arousal IS NULL)"
+COMPLETED = "(emotion IS NOT NULL AND valence IS NOT NULL AND arousal IS NOT NULL)"
+
+
+def check_unique_filepaths(cursor):
+    cursor.execute(
+        """
+        SELECT filepath, COUNT(*) FROM markup_results
+        GROUP BY filepath HAVING COUNT(*) > 1
+        LIMIT 5
+    """
+    )
+    duplicates = cursor.fetchall()
+    if duplicates:
+        paths = ", ".join(row[0] for row in duplicates)
+        raise RuntimeError(
+            f"Cannot add unique filepath key, duplicated rows exist (e.g. {paths}). "
+            "Remove the duplicate rows and run the migration again."
+        )
+
+
+# Baseline migrations use IF NOT EXISTS so databases created before the
+# framework existed are adopted without changes
+MIGRATIONS = [
+    {
+        "version": 1,
+        "name": "create markup_results",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS markup_results (
+                id SERIAL PRIMARY KEY,
+                filename VARCHAR(255) NOT NULL,
+                filepath VARCHAR(500) NOT NULL,
+                type VARCHAR(10) NOT NULL CHECK (type IN ('image', 'video')),
+                emotion VARCHAR(20) CHECK (emotion IN (
+                    'angry', 'sad', 'neutral', 'happy', 'disgust', 'surprise', 'fear'
+                )),
+                valence DECIMAL(3,2) CHECK (valence >= -1.0 AND valence <= 1.0),
+                arousal DECIMAL(3,2) CHECK (arousal >= -1.0 AND arousal <= 1.0),
+                title VARCHAR(255),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_emotion ON markup_results(emotion)",
+            "CREATE INDEX IF NOT EXISTS idx_filename ON markup_results(filename)",
+            "CREATE INDEX IF NOT EXISTS idx_created ON markup_results(created_at DESC)",
+        ],
+    },
+    {
+        "version": 2,
+        "name": "media metadata columns",
+        "statements": [
+            """
+            ALTER TABLE markup_results
+                ADD COLUMN IF NOT EXISTS file_size BIGINT,
+                ADD COLUMN IF NOT EXISTS width INTEGER,
+                ADD COLUMN IF NOT EXISTS height INTEGER,
+                ADD COLUMN IF NOT EXISTS duration REAL,
+                ADD COLUMN IF NOT EXISTS codec VARCHAR(32),
+                ADD COLUMN IF NOT EXISTS frame_count INTEGER
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_duration ON markup_results(type, duration)",
+            "CREATE INDEX IF NOT EXISTS idx_dimensions ON markup_results(width, height)",
+            "CREATE INDEX IF NOT EXISTS idx_file_size ON markup_results(file_size)",
+        ],
+    },
+    {
+        "version": 3,
+        "name": "video timelines",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS video_traces (
+                id SERIAL PRIMARY KEY,
+                media_id INTEGER NOT NULL REFERENCES markup_results(id) ON DELETE CASCADE,
+                dimension VARCHAR(10) NOT NULL CHECK (dimension IN ('valence', 'arousal')),
+                sample_rate REAL NOT NULL CHECK (sample_rate > 0),
+                start_time REAL NOT NULL DEFAULT 0,
+                sample_count INTEGER NOT NULL,
+                data BYTEA NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (media_id, dimension)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS video_emotion_segments (
+                id SERIAL PRIMARY KEY,
+                media_id INTEGER NOT NULL REFERENCES markup_results(id) ON DELETE CASCADE,
+                start_time REAL NOT NULL,
+                end_time REAL NOT NULL CHECK (end_time > start_time),
+                emotion VARCHAR(20) NOT NULL CHECK (emotion IN (
+                    'angry', 'sad', 'neutral', 'happy', 'disgust', 'surprise', 'fear'
+                )),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_segments_media
+            ON video_emotion_segments(media_id, start_time)
+            """,
+        ],
+    },
+    {
+        "version": 4,
+        "name": "media priority",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS media_priority (
+                media_id INTEGER PRIMARY KEY REFERENCES markup_results(id) ON DELETE CASCADE,
+                uncertainty REAL,
+                disagreement REAL,
+                predicted_emotion VARCHAR(20),
+                score DOUBLE PRECISION NOT NULL DEFAULT 0,
+                pending BOOLEAN NOT NULL DEFAULT TRUE,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            # Dispatch of the highest-priority pending item is one index descent
+            """
+            CREATE INDEX IF NOT EXISTS idx_priority_pending
+            ON media_priority(score DESC, media_id) WHERE pending
+            """,
+        ],
+    },
+    {
+        "version": 5,
+        "name": "perceptual hashes",
+        "statements": [
+            """
+            ALTER TABLE markup_results
+                ADD COLUMN IF NOT EXISTS phash BIGINT,
+                ADD COLUMN IF NOT EXISTS dhash BIGINT,
+                ADD COLUMN IF NOT EXISTS phash_b0 INTEGER,
+                ADD COLUMN IF NOT EXISTS phash_b1 INTEGER,
+                ADD COLUMN IF NOT EXISTS phash_b2 INTEGER,
+                ADD COLUMN IF NOT EXISTS phash_b3 INTEGER,
+                ADD COLUMN IF NOT EXISTS duplicate_of INTEGER
+                    REFERENCES markup_results(id) ON DELETE SET NULL
+            """,
+        ]
+        + [
+            f"CREATE INDEX IF NOT EXISTS idx_phash_b{band} ON markup_results(phash_b{band})"
+            for band in range(HASH_BANDS)
+        ]
+        + [
+            "CREATE INDEX IF NOT EXISTS idx_duplicate_of ON markup_results(duplicate_of)"
+        ],
+    },
+    {
+        "version": 6,
+        "name": "covering indexes for queue and stats queries",
+        "transactional": False,
+        "statements": [
+            # get_next_unannotated / get_unannotated: WHERE id > %s AND pending ORDER BY id
+            f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pending_id
+            ON markup_results(id) WHERE {PENDING}
+            """,
+            # Same queue with ?skip_duplicates=1
+            f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_pending_unique_id
+            ON markup_results(id) WHERE {PENDING} AND duplicate_of IS NULL
+            """,
+            # get_annotated ordering and the annotated count in get_stats
+            f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_completed_updated
+            ON markup_results(updated_at DESC) WHERE {COMPLETED}
+            """,
+            # get_stats type distribution as an index-only scan
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_type ON markup_results(type)",
+            # get_stats VAD averages as an index-only scan
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_vad
+            ON markup_results(valence, arousal)
+            WHERE valence IS NOT NULL AND arousal IS NOT NULL
+            """,
+            # Filename lookups; neither query is index-only (get_by_filename
+            # reads the whole row), superseded by idx_dataset_filename
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_filename_covering
+            ON markup_results(filename) INCLUDE (id, filepath)
+            """,
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_filename",
+        ],
+    },
+    {
+        "version": 7,
+        "name": "unique filepath key",
+        "transactional": False,
+        "statements": [
+            check_unique_filepaths,
+            """
+            CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_unique_filepath
+            ON markup_results(filepath)
+            """,
+        ],
+    },
+    {
+        "version": 8,
+        "name": "datasets",
+        "statements": [
+            """
+            CREATE TABLE IF NOT EXISTS datasets (
+                id SERIAL PRIMARY KEY,
+                name VARCHAR(100) NOT NULL UNIQUE,
+                description TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            # Everything ingested so far becomes the default dataset (id 1)
+            "INSERT INTO datasets (id, name) VALUES (1, 'default') ON CONFLICT DO NOTHING",
+            "SELECT setval('datasets_id_seq', (SELECT MAX(id) FROM datasets))",
+            """
+            ALTER TABLE markup_results
+                ADD COLUMN IF NOT EXISTS dataset_id INTEGER NOT NULL DEFAULT 1
+                    REFERENCES datasets(id) ON DELETE CASCADE
+            """,
+            """
+            ALTER TABLE media_priority
+                ADD COLUMN IF NOT EXISTS dataset_id INTEGER NOT NULL DEFAULT 1
+                    REFERENCES datasets(id) ON DELETE CASCADE
+            """,
+            """
+            UPDATE media_priority p SET dataset_id = m.dataset_id
+            FROM markup_results m
+            WHERE m.id = p.media_id AND p.dataset_id <> m.dataset_id
+            """,
+            # Cached get_stats() output per dataset
+            """
+            CREATE TABLE IF NOT EXISTS dataset_stats (
+                dataset_id INTEGER PRIMARY KEY REFERENCES datasets(id) ON DELETE CASCADE,
+                stats JSONB NOT NULL,
+                computed_at TIMESTAMP NOT NULL
+            )
+            """,
+        ],
+    },
+    {
+        "version": 9,
+        "name": "dataset-scoped indexes",
+        "transactional": False,
+        "statements": [
+            # Leading dataset_id keeps each dataset's queue and stats in its own
+            # index range, so a huge dataset never slows a small one down
+            f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_dataset_pending_id
+            ON markup_results(dataset_id, id) WHERE {PENDING}
+            """,
+            f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_dataset_pending_unique_id
+            ON markup_results(dataset_id, id) WHERE {PENDING} AND duplicate_of IS NULL
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_dataset_id
+            ON markup_results(dataset_id, id)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_dataset_created
+            ON markup_results(dataset_id, created_at DESC)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_dataset_emotion
+            ON markup_results(dataset_id, emotion)
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_dataset_type
+            ON markup_results(dataset_id, type)
+            """,
+            f"""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_dataset_completed_updated
+            ON markup_results(dataset_id, updated_at DESC) WHERE {COMPLETED}
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_dataset_vad
+            ON markup_results(dataset_id, valence, arousal)
+            WHERE valence IS NOT NULL AND arousal IS NOT NULL
+            """,
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_priority_dataset_pending
+            ON media_priority(dataset_id, score DESC, media_id) WHERE pending
+            """,
+            # Superseded by the dataset-leading versions above
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_pending_id",
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_pending_unique_id",
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_completed_updated",
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_type",
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_vad",
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_priority_pending",
+        ],
+    },
+    {
+        "version": 10,
+        "name": "annotator events and hourly rollups",
+        "statements": [
+            # Append-only: no foreign keys or updates, so batched inserts stay cheap
+            """
+            CREATE TABLE IF NOT EXISTS annotation_events (
+                id BIGSERIAL PRIMARY KEY,
+                annotator VARCHAR(100) NOT NULL,
+                session_id VARCHAR(64),
+                dataset_id INTEGER,
+                media_id INTEGER,
+                event_type VARCHAR(20) NOT NULL CHECK (event_type IN (
+                    'view', 'annotate', 'skip'
+                )),
+                duration_ms INTEGER,
+                created_at TIMESTAMP NOT NULL
+            )
+            """,
+            # Rows arrive in time order, so a BRIN index covers time ranges tiny
+            """
+            CREATE INDEX IF NOT EXISTS idx_events_created
+            ON annotation_events USING BRIN (created_at)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_events_annotator
+            ON annotation_events(annotator, created_at)
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS annotator_hourly_stats (
+                annotator VARCHAR(100) NOT NULL,
+                dataset_id INTEGER NOT NULL,
+                hour TIMESTAMP NOT NULL,
+                views INTEGER NOT NULL DEFAULT 0,
+                annotations INTEGER NOT NULL DEFAULT 0,
+                skips INTEGER NOT NULL DEFAULT 0,
+                time_on_item_ms BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (annotator, dataset_id, hour)
+            )
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS idx_hourly_stats_hour
+            ON annotator_hourly_stats(hour, dataset_id)
+            """,
+        ],
+    },
+    {
+        "version": 11,
+        "name": "model predictions",
+        "statements": [
+            f"""
+            CREATE TABLE IF NOT EXISTS predictions (
+                media_id INTEGER NOT NULL REFERENCES markup_results(id) ON DELETE CASCADE,
+                model VARCHAR(100) NOT NULL,
+                {" ".join(f"score_{emotion} REAL," for emotion in EMOTIONS)}
+                predicted_emotion VARCHAR(20),
+                confidence REAL,
+                valence REAL,
+                arousal REAL,
+                dominance REAL,
+                imported_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (media_id, model)
+            )
+            """,
+            # Best model confidence is denormalized so the queue can filter on it
+            """
+            ALTER TABLE markup_results
+                ADD COLUMN IF NOT EXISTS model_confidence REAL,
+                ADD COLUMN IF NOT EXISTS label_source VARCHAR(10) NOT NULL DEFAULT 'human'
+                    CHECK (label_source IN ('human', 'model'))
+            """,
+        ],
+    },
+    {
+        "version": 12,
+        "name": "label versions",
+        "statements": [
+            # Bumped on every label write; clients send it back for
+            # optimistic concurrency (UPDATE ... WHERE version = %s)
+            """
+            ALTER TABLE markup_results
+                ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1
+            """,
+        ],
+    },
+    {
+        "version": 13,
+        "name": "dataset-scoped pHash band indexes",
+        "transactional": False,
+        "statements": [
+            # Near-duplicate lookups only ever search within one dataset
+            *(
+                f"""
+                CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_dataset_phash_b{band}
+                ON markup_results(dataset_id, phash_b{band})
+                """
+                for band in range(HASH_BANDS)
+            ),
+            *(
+                f"DROP INDEX CONCURRENTLY IF EXISTS idx_phash_b{band}"
+                for band in range(HASH_BANDS)
+            ),
+        ],
+    },
+    {
+        "version": 14,
+        "name": "priority leases",
+        "statements": [
+            # Items handed out by the priority queue are reserved until then
+            """
+            ALTER TABLE media_priority
+                ADD COLUMN IF NOT EXISTS leased_until TIMESTAMP
+            """,
+        ],
+    },
+    {
+        "version": 15,
+        "name": "timed items in hourly stats",
+        "statements": [
+            # Average time on item must only count events that carried a duration
+            """
+            ALTER TABLE annotator_hourly_stats
+                ADD COLUMN IF NOT EXISTS timed_items INTEGER NOT NULL DEFAULT 0
+            """,
+            """
+            UPDATE annotator_hourly_stats s SET timed_items = e.timed_items
+            FROM (
+                SELECT annotator, COALESCE(dataset_id, 1) AS dataset_id,
+                       date_trunc('hour', created_at) AS hour,
+                       COUNT(*) AS timed_items
+                FROM annotation_events
+                WHERE event_type <> 'view' AND duration_ms IS NOT NULL
+                GROUP BY 1, 2, 3
+            ) e
+            WHERE s.annotator = e.annotator AND s.dataset_id = e.dataset_id
+              AND s.hour = e.hour
+            """,
+        ],
+    },
+    {
+        "version": 16,
+        "name": "dataset-scoped filename index",
+        "transactional": False,
+        "statements": [
+            # Every filename lookup is scoped to a dataset: get_existing_filenames
+            # runs as an index-only scan and update_filepaths compares filepath
+            # without visiting rows that are already up to date
+            """
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_dataset_filename
+            ON markup_results(dataset_id, filename) INCLUDE (filepath)
+            """,
+            "DROP INDEX CONCURRENTLY IF EXISTS idx_filename_covering",
+        ],
+    },
+]
+
+
+def _ensure_migrations_table(conn):
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """
+        )
+    conn.commit()
+
+
+def applied_versions(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT version FROM schema_migrations")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _run_statements(cursor, statements):
+    for statement in statements:
+        if callable(statement):
+            statement(cursor)
+        else:
+            cursor.execute(statement)
+
+
+def _concurrent_indexes(statements):
+    return [
+        name
+        for statement in statements
+        if not callable(statement)
+        for name in CONCURRENT_INDEX.findall(statement)
+    ]
+
+
+def _invalid_indexes(cursor, names):
+    """Names of the given indexes left INVALID by a failed concurrent build"""
+    cursor.execute(
+        """
+        SELECT c.relname
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = ANY(%s) AND pg_table_is_visible(c.oid)
+          AND NOT i.indisvalid
+    """,
+        (names,),
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _apply(conn, migration):
+    record = (
+        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+        (migration["version"], migration["name"]),
+    )
+    if migration.get("transactional", True):
+        with conn.cursor() as cursor:
+            _run_statements(cursor, migration["statements"])
+            cursor.execute(*record)
+        conn.commit()
+    else:
+        indexes = _concurrent_indexes(migration["statements"])
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                # IF NOT EXISTS would skip a leftover invalid index; rebuild it
+                for name in _invalid_indexes(cursor, indexes):
+                    print(f"⚠️  Dropping invalid index {name}")
+                    cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                _run_statements(cursor, migration["statements"])
+                invalid = _invalid_indexes(cursor, indexes)
+                if invalid:
+                    raise RuntimeError(
+                        f"Invalid indexes after build: {', '.join(invalid)}"
+                    )
+                cursor.execute(*record)
+        finally:
+            conn.autocommit = False
+
+
+def migrate(db):
+    """Apply all pending migrations; returns the list of applied versions"""
+    import psycopg2
+
+    conn = psycopg2.connect(**db.db_params)
+    try:
+        conn.autocommit = True
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        conn.autocommit = False
+
+        try:
+            _ensure_migrations_table(conn)
+            done = applied_versions(conn)
+            conn.commit()
+            applied = []
+            for migration in sorted(MIGRATIONS, key=lambda m: m["version"]):
+                if migration["version"] in done:
+                    continue
+                print(
+                    f"⏳ Applying migration {migration['version']}: {migration['name']}"
+                )
+                try:
+                    _apply(conn, migration)
+                except Exception:
+                    conn.rollback()
+                    raise
+                applied.append(migration["version"])
+            conn.commit()
+            return applied
+        finally:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+    finally:
+        conn.close()
+
+
+def status(db):
+    """Return (version, name, applied) for every known migration"""
+    with db.get_connection() as conn:
+        _ensure_migrations_table(conn)
+        done = applied_versions(conn)
+    return [
+        (migration["version"], migration["name"], migration["version"] in done)
+        for migration in sorted(MIGRATIONS, key=lambda m: m["version"])
+    ]
+
+
+if __name__ == "__main__":
+    from database import db
+
+    if len(sys.argv) > 1 and sys.argv[1] == "status":
+        for version, name, applied in status(db):
+            print(f"{'✅' if applied else '⏳'} {version:>4}  {name}")
+    else:
+        applied = migrate(db)
+        print(f"✅ Applied {len(applied)} migration(s)" if applied else "✅ Up to date")
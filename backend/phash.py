@@ -0,0 +1,104 @@
+import math
+from itertools import combinations
+
+# pHash: DCT of a 32x32 grayscale thumbnail, keeping the 8x8 low frequencies
+PHASH_SIZE = 32
+PHASH_LOW = 8
+
+# Hashes are split into 16-bit bands for multi-index Hamming search. Two
+# hashes within HASH_BANDS * (r + 1) - 1 bits have a band differing in at
+# most r bits, so probing every band value within r bits finds them all
+HASH_BANDS = 4
+BAND_BITS = 16
+MAX_PROBE_RADIUS = 2
+MAX_DISTANCE = HASH_BANDS * (MAX_PROBE_RADIUS + 1) - 1
+
+# Default near-duplicate threshold, about what resizing and recompression cost
+DEFAULT_DISTANCE = 10
+
+_DCT = [
+    [math.cos(math.pi * (2 * x + 1) * u / (2 * PHASH_SIZE)) for x in range(PHASH_SIZE)]
+    for u in range(PHASH_LOW)
+]
+
+
+def _bits_to_int(bits):
+    value = 0
+    for bit in bits:
+        value = (value << 1) | int(bit)
+    return value
+
+
+def dhash(img):
+    """Difference hash: compare horizontally adjacent pixels of a 9x8 thumbnail"""
+    from PIL import Image
+
+    small = img.convert("L").resize((9, 8), Image.LANCZOS)
+    pixels = list(small.getdata())
+    bits = [
+        pixels[row * 9 + col] > pixels[row * 9 + col + 1]
+        for row in range(8)
+        for col in range(8)
+    ]
+    return _bits_to_int(bits)
+
+
+def phash(img):
+    """Perceptual hash: sign of low DCT frequencies relative to their median"""
+    from PIL import Image
+
+    small = img.convert("L").resize((PHASH_SIZE, PHASH_SIZE), Image.LANCZOS)
+    pixels = list(small.getdata())
+    rows = [pixels[i * PHASH_SIZE : (i + 1) * PHASH_SIZE] for i in range(PHASH_SIZE)]
+
+    # Separable 2D DCT, computing only the coefficients we keep
+    row_dct = [
+        [sum(c * p for c, p in zip(basis, row)) for basis in _DCT] for row in rows
+    ]
+    coefficients = [
+        sum(_DCT[u][y] * row_dct[y][v] for y in range(PHASH_SIZE))
+        for u in range(PHASH_LOW)
+        for v in range(PHASH_LOW)
+    ]
+
+    # Skip the DC term when picking the threshold, it dominates otherwise
+    median = sorted(coefficients[1:])[len(coefficients[1:]) // 2]
+    return _bits_to_int(c > median for c in coefficients)
+
+
+def to_signed(value):
+    """Map an unsigned 64-bit hash onto Postgres BIGINT"""
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def bands(value):
+    """Split an unsigned 64-bit hash into HASH_BANDS integers"""
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (BAND_BITS * i)) & mask for i in range(HASH_BANDS)]
+
+
+def band_neighbours(band, radius):
+    """All BAND_BITS-bit values within radius bits of band"""
+    values = [band]
+    for flips in range(1, radius + 1):
+        for positions in combinations(range(BAND_BITS), flips):
+            value = band
+            for position in positions:
+                value ^= 1 << position
+            values.append(value)
+    return values
+
+
+def probe_bands(value, max_distance):
+    """Band values to look up so no hash within max_distance bits is missed"""
+    radius = max_distance // HASH_BANDS
+    return [band_neighbours(band, radius) for band in bands(value)]
+
+
+def image_hashes(img):
+    """Return the hash columns stored for an image"""
+    p = phash(img)
+    columns = {"phash": to_signed(p), "dhash": to_signed(dhash(img))}
+    for i, band in enumerate(bands(p)):
+        columns[f"phash_b{i}"] = band
+    return columns
@@ -0,0 +1,294 @@
+"""Import offline model predictions and auto-accept confident ones.
+
+Usage:
+    python predictions.py FILE --model NAME [--threshold 0.9] [--dataset ID]
+
+FILE is JSONL (one prediction per line) or Parquet (requires pyarrow).
+Each record names the media by "media_id" or "filename" and carries
+"scores" ({emotion: probability}) plus optional "valence", "arousal" and
+"dominance". Records are streamed into Postgres with COPY, never held in
+memory all at once.
+"""
+
+import argparse
+import json
+
+import psycopg2
+
+from database import db, DEFAULT_DATASET_ID
+
+# Score columns are the ones created by the predictions migration
+from migrations import EMOTIONS
+
+# Predictions at or above this confidence are accepted as labels
+DEFAULT_THRESHOLD = 0.9
+
+STAGING_COLUMNS = (
+    ["media_id", "filename"]
+    + [f"score_{emotion}" for emotion in EMOTIONS]
+    + ["valence", "arousal", "dominance"]
+)
+
+
+def iter_jsonl(fileobj):
+    for line in fileobj:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def iter_parquet(fileobj, batch_size=10_000):
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(fileobj).iter_batches(batch_size=batch_size):
+        yield from batch.to_pylist()
+
+
+def iter_records(fileobj, filename):
+    if filename.lower().endswith(".parquet"):
+        return iter_parquet(fileobj)
+    return iter_jsonl(fileobj)
+
+
+def _copy_value(value):
+    """Format a value for COPY ... FROM STDIN text format"""
+    if value is None:
+        return "\\N"
+    text = str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _number(value, field):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"{field} must be a number")
+    return value
+
+
+def _media_id(value):
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError("media_id must be an integer")
+    return value
+
+
+def to_row(record):
+    """Validate one prediction record and flatten it into staging columns"""
+    if not isinstance(record, dict):
+        raise ValueError("each prediction must be an object")
+    scores = record.get("scores") or {}
+    if not isinstance(scores, dict):
+        raise ValueError("scores must be an object")
+    if not scores:
+        # Parquet files usually carry flat score_<emotion> columns instead
+        scores = {
+            emotion: record.get(f"score_{emotion}")
+            for emotion in EMOTIONS
+            if record.get(f"score_{emotion}") is not None
+        }
+    media_id = _media_id(record.get("media_id", record.get("mediaId")))
+    filename = record.get("filename")
+    if media_id is None and not isinstance(filename, str):
+        raise ValueError("each prediction needs a media_id or a filename")
+    row = [media_id, filename]
+    row += [_number(scores.get(emotion), f"score {emotion}") for emotion in EMOTIONS]
+    row += [
+        _number(record.get(field), field)
+        for field in ("valence", "arousal", "dominance")
+    ]
+    return "\t".join(_copy_value(value) for value in row) + "\n"
+
+
+class CopyStream:
+    """File-like object feeding COPY from a record iterator, chunk by chunk.
+
+    psycopg2 replaces exceptions raised inside read() with a generic COPY
+    failure, so parse/validation errors end the stream early and are kept
+    in .error for the caller to re-raise.
+    """
+
+    def __init__(self, records):
+        self.records = iter(records)
+        self.buffer = ""
+        self.count = 0
+        self.error = None
+
+    def read(self, size=-1):
+        while self.error is None and (size < 0 or len(self.buffer) < size):
+            try:
+                record = next(self.records)
+                self.buffer += to_row(record)
+                self.count += 1
+            except StopIteration:
+                break
+            except Exception as e:
+                self.error = ValueError(f"record {self.count + 1}: {e}")
+                self.buffer = ""
+        if size < 0:
+            size = len(self.buffer)
+        chunk, self.buffer = self.buffer[:size], self.buffer[size:]
+        return chunk
+
+    readline = read
+
+
+def import_predictions(
+    records, model, threshold=DEFAULT_THRESHOLD, dataset_id=DEFAULT_DATASET_ID
+):
+    """Stream predictions into the predictions table and auto-accept labels.
+
+    Everything happens in one transaction: COPY into a temp staging table,
+    resolve media by id or filename within the dataset, upsert predictions,
+    refresh markup_results.model_confidence and finally fill in labels for
+    pending items whose prediction is confident enough.
+    """
+    score_columns = [f"score_{emotion}" for emotion in EMOTIONS]
+    stream = CopyStream(records)
+
+    with db.get_cursor() as cursor:
+        cursor.execute(
+            f"""
+            CREATE TEMP TABLE prediction_staging (
+                media_id INTEGER,
+                filename VARCHAR(255),
+                {", ".join(f"{column} REAL" for column in score_columns)},
+                valence REAL,
+                arousal REAL,
+                dominance REAL
+            ) ON COMMIT DROP
+        """
+        )
+        try:
+            cursor.copy_expert(
+                f"COPY prediction_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN",
+                stream,
+                size=64 * 1024,
+            )
+        except psycopg2.DataError as e:
+            # Values that pass validation but not the column types, e.g. out of range
+            raise ValueError(str(e).splitlines()[0])
+        if stream.error:
+            raise stream.error
+
+        # Highest score wins; ties resolve in EMOTIONS order
+        best = (
+            "GREATEST("
+            + ", ".join(f"COALESCE(s.{column}, 0)" for column in score_columns)
+            + ")"
+        )
+        predicted = (
+            "CASE "
+            + " ".join(
+                f"WHEN COALESCE(s.{column}, 0) = {best} THEN '{emotion}'"
+                for emotion, column in zip(EMOTIONS, score_columns)
+            )
+            + " END"
+        )
+        cursor.execute(
+            f"""
+            INSERT INTO predictions
+                (media_id, model, {", ".join(score_columns)},
+                 predicted_emotion, confidence, valence, arousal, dominance)
+            SELECT DISTINCT ON (m.id)
+                   m.id, %s, {", ".join(f"s.{column}" for column in score_columns)},
+                   {predicted}, {best},
+                   LEAST(GREATEST(s.valence, -1), 1),
+                   LEAST(GREATEST(s.arousal, -1), 1),
+                   s.dominance
+            FROM prediction_staging s
+            JOIN markup_results m
+              ON m.dataset_id = %s
+             AND (m.id = s.media_id OR (s.media_id IS NULL AND m.filename = s.filename))
+            ORDER BY m.id
+            ON CONFLICT (media_id, model) DO UPDATE SET
+                {", ".join(f"{column} = EXCLUDED.{column}" for column in score_columns)},
+                predicted_emotion = EXCLUDED.predicted_emotion,
+                confidence = EXCLUDED.confidence,
+                valence = EXCLUDED.valence,
+                arousal = EXCLUDED.arousal,
+                dominance = EXCLUDED.dominance,
+                imported_at = CURRENT_TIMESTAMP
+        """,
+            (model, dataset_id),
+        )
+        imported = cursor.rowcount
+
+        # Queue routing looks at the best confidence over all models
+        cursor.execute(
+            """
+            UPDATE markup_results m
+            SET model_confidence = p.confidence
+            FROM (
+                SELECT p.media_id, MAX(p.confidence) AS confidence
+                FROM predictions p
+                JOIN predictions imported
+                  ON imported.media_id = p.media_id AND imported.model = %s
+                JOIN markup_results r
+                  ON r.id = p.media_id AND r.dataset_id = %s
+                GROUP BY p.media_id
+            ) p
+            WHERE m.id = p.media_id
+              AND m.model_confidence IS DISTINCT FROM p.confidence
+        """,
+            (model, dataset_id),
+        )
+
+        # Auto-accept: only fills labels nobody has set, never overwrites humans,
+        # and takes accepted items out of the priority queue
+        cursor.execute(
+            """
+            WITH accepted AS (
+                UPDATE markup_results m
+                SET emotion = COALESCE(m.emotion, p.predicted_emotion),
+                    valence = COALESCE(m.valence, ROUND(p.valence::numeric, 2)),
+                    arousal = COALESCE(m.arousal, ROUND(p.arousal::numeric, 2)),
+                    label_source = 'model',
+                    version = m.version + 1,
+                    updated_at = CURRENT_TIMESTAMP
+                FROM predictions p
+                WHERE p.media_id = m.id
+                  AND p.model = %s
+                  AND m.dataset_id = %s
+                  AND p.confidence >= %s
+                  AND p.valence IS NOT NULL AND p.arousal IS NOT NULL
+                  AND m.emotion IS NULL AND m.valence IS NULL AND m.arousal IS NULL
+                RETURNING m.id
+            ),
+            dequeued AS (
+                UPDATE media_priority SET pending = FALSE
+                FROM accepted WHERE media_priority.media_id = accepted.id
+            )
+            SELECT COUNT(*) AS accepted FROM accepted
+        """,
+            (model, dataset_id, threshold),
+        )
+        accepted = cursor.fetchone()["accepted"]
+
+    return {
+        "records": stream.count,
+        "imported": imported,
+        "auto_accepted": accepted,
+        "unmatched": stream.count - imported,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("file")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--dataset", type=int, default=DEFAULT_DATASET_ID)
+    args = parser.parse_args()
+
+    with open(args.file, "rb") as f:
+        result = import_predictions(
+            iter_records(f, args.file), args.model, args.threshold, args.dataset
+        )
+    print(
+        f"✅ Imported {result['imported']} of {result['records']} predictions, "
+        f"auto-accepted {result['auto_accepted']}"
+    )
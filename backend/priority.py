@@ -0,0 +1,79 @@
+from database import MarkupResult, MediaPriority
+
+# Rows scored and written back per round trip during a refresh
+REFRESH_BATCH_SIZE = 5000
+
+DEFAULT_WEIGHTS = {"uncertainty": 1.0, "rarity": 0.5, "disagreement": 1.0}
+
+
+def uncertainty_score(item, context):
+    """Model uncertainty imported for the item (0 = confident, 1 = unsure)"""
+    return item["uncertainty"] or 0.0
+
+
+def disagreement_score(item, context):
+    """Disagreement between models/annotators imported for the item"""
+    return item["disagreement"] or 0.0
+
+
+def rarity_score(item, context):
+    """Favor items predicted as emotions under-represented in emotion_summary"""
+    emotion = item["predicted_emotion"]
+    if not emotion:
+        return 0.0
+    summary = context["emotion_summaries"][item["dataset_id"]]
+    total = sum(summary.values())
+    if not total:
+        return 1.0
+    return 1.0 - summary.get(emotion, 0) / total
+
+
+# Pluggable scorers: register a function(item, context) -> float in [0, 1]
+SCORERS = {
+    "uncertainty": uncertainty_score,
+    "rarity": rarity_score,
+    "disagreement": disagreement_score,
+}
+
+
+def compute_score(item, context, weights):
+    return sum(
+        weight * SCORERS[name](item, context)
+        for name, weight in weights.items()
+        if weight
+    )
+
+
+def refresh_scores(weights=None, batch_size=REFRESH_BATCH_SIZE, media_ids=None):
+    """Recompute priority scores in keyset-paginated batches.
+
+    Only the given media_ids are rescored when provided, all items otherwise.
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    unknown = set(weights) - set(SCORERS)
+    if unknown:
+        raise ValueError(f"Unknown scorers: {', '.join(sorted(unknown))}")
+
+    # Rarity is judged within each item's own dataset
+    context = {"emotion_summaries": {}}
+    summaries = context["emotion_summaries"]
+
+    refreshed = 0
+    last_id = 0
+    while True:
+        batch = MediaPriority.get_batch(last_id, batch_size, media_ids)
+        if not batch:
+            break
+        for item in batch:
+            if item["dataset_id"] not in summaries:
+                stats = MarkupResult.get_stats(item["dataset_id"])
+                summaries[item["dataset_id"]] = stats["emotion_summary"]
+        MediaPriority.update_scores(
+            [
+                (item["media_id"], compute_score(item, context, weights))
+                for item in batch
+            ]
+        )
+        refreshed += len(batch)
+        last_id = batch[-1]["media_id"]
+    return refreshed
@@ -0,0 +1,288 @@
+"""Versioned, immutable label releases of a dataset.
+
+Usage:
+    python releases.py build [--dataset ID]
+    python releases.py list [--dataset ID]
+    python releases.py verify VERSION [--dataset ID]
+    python releases.py diff OLD NEW [--dataset ID]
+
+A release is a directory RELEASES_DIR/<dataset>/v<N>/ holding the completed
+labels as an uncompressed Arrow IPC file (memory-mappable, readable with
+pyarrow/polars/pandas) and a manifest.json with the Postgres snapshot,
+row count, schema and SHA-256 checksums. Rows are read from a single
+REPEATABLE READ snapshot in chunks through a server-side cursor, so a
+release is consistent without holding the whole dataset in memory.
+Diffs only read release files, never the live database.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from database import db, DEFAULT_DATASET_ID
+from migrations import COMPLETED
+
+RELEASES_DIR = os.getenv("RELEASES_DIR", "releases")
+RELEASE_CHUNK_SIZE = 10_000
+
+LABELS_FILE = "labels.arrow"
+MANIFEST_FILE = "manifest.json"
+
+# Column name, SQL expression, Arrow type name
+RELEASE_COLUMNS = [
+    ("id", "id", "int64"),
+    ("filename", "filename", "string"),
+    ("filepath", "filepath", "string"),
+    ("type", "type", "string"),
+    ("emotion", "emotion", "string"),
+    ("valence", "valence::float8", "float64"),
+    ("arousal", "arousal::float8", "float64"),
+    ("label_source", "label_source", "string"),
+    ("duplicate_of", "duplicate_of", "int64"),
+    ("updated_at", "updated_at", "timestamp[us]"),
+]
+
+# Columns compared by diff_releases
+LABEL_COLUMNS = ["emotion", "valence", "arousal"]
+
+
+def release_schema():
+    import pyarrow as pa
+
+    types = {
+        "int64": pa.int64(),
+        "string": pa.string(),
+        "float64": pa.float64(),
+        "timestamp[us]": pa.timestamp("us"),
+    }
+    return pa.schema(
+        [(name, types[type_name]) for name, _, type_name in RELEASE_COLUMNS]
+    )
+
+
+def dataset_dir(dataset_id):
+    return os.path.join(RELEASES_DIR, str(dataset_id))
+
+
+def release_dir(dataset_id, version):
+    return os.path.join(dataset_dir(dataset_id), f"v{version}")
+
+
+def list_versions(dataset_id):
+    directory = dataset_dir(dataset_id)
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        int(name[1:])
+        for name in os.listdir(directory)
+        if name.startswith("v") and name[1:].isdigit()
+    )
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_labels(conn, path, dataset_id, chunk_size):
+    """Stream completed labels into an Arrow IPC file; returns the row count"""
+    import pyarrow as pa
+
+    schema = release_schema()
+    rows = 0
+    # Named cursor: rows stay on the server until fetched chunk by chunk
+    with conn.cursor(name="release_rows") as cursor:
+        cursor.itersize = chunk_size
+        cursor.execute(
+            f"""
+            SELECT {", ".join(expression for _, expression, _ in RELEASE_COLUMNS)}
+            FROM markup_results
+            WHERE dataset_id = %s AND {COMPLETED}
+            ORDER BY id
+        """,
+            (dataset_id,),
+        )
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+            while True:
+                chunk = cursor.fetchmany(chunk_size)
+                if not chunk:
+                    break
+                columns = zip(*chunk)
+                writer.write_batch(
+                    pa.record_batch(
+                        [
+                            pa.array(values, type=field.type)
+                            for values, field in zip(columns, schema)
+                        ],
+                        schema=schema,
+                    )
+                )
+                rows += len(chunk)
+    return rows
+
+
+def build_release(dataset_id=DEFAULT_DATASET_ID, chunk_size=RELEASE_CHUNK_SIZE):
+    """Snapshot the completed labels of a dataset into a new release"""
+    os.makedirs(dataset_dir(dataset_id), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".building-", dir=dataset_dir(dataset_id))
+    try:
+        labels_path = os.path.join(staging, LABELS_FILE)
+        with db.snapshot() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_current_snapshot()::text, now()")
+                snapshot, snapshot_at = cursor.fetchone()
+            rows = write_labels(conn, labels_path, dataset_id, chunk_size)
+
+        manifest = {
+            "dataset_id": dataset_id,
+            "created_at": datetime.now().isoformat(),
+            "snapshot": snapshot,
+            "snapshot_at": snapshot_at.isoformat(),
+            "rows": rows,
+            "schema": [
+                {"name": name, "type": type_name}
+                for name, _, type_name in RELEASE_COLUMNS
+            ],
+            "files": {
+                LABELS_FILE: {
+                    "sha256": file_sha256(labels_path),
+                    "bytes": os.path.getsize(labels_path),
+                }
+            },
+        }
+
+        # Claim the next version with an atomic rename; a concurrent build
+        # that got there first makes the rename fail and we take the next one
+        version = (list_versions(dataset_id) or [0])[-1] + 1
+        while True:
+            manifest["version"] = version
+            with open(os.path.join(staging, MANIFEST_FILE), "w") as f:
+                json.dump(manifest, f, indent=2)
+            for name in os.listdir(staging):
+                os.chmod(os.path.join(staging, name), 0o444)
+            try:
+                os.rename(staging, release_dir(dataset_id, version))
+                break
+            except OSError:
+                if not os.path.exists(release_dir(dataset_id, version)):
+                    raise
+                os.chmod(os.path.join(staging, MANIFEST_FILE), 0o644)
+                version += 1
+        return manifest
+    finally:
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+
+
+def get_manifest(dataset_id, version):
+    path = os.path.join(release_dir(dataset_id, version), MANIFEST_FILE)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Release v{version} of dataset {dataset_id} not found")
+    with open(path) as f:
+        return json.load(f)
+
+
+def list_releases(dataset_id=DEFAULT_DATASET_ID):
+    return [get_manifest(dataset_id, version) for version in list_versions(dataset_id)]
+
+
+def labels_path(dataset_id, version):
+    get_manifest(dataset_id, version)
+    return os.path.join(release_dir(dataset_id, version), LABELS_FILE)
+
+
+def load_labels(dataset_id, version, columns=None):
+    """Memory-map the labels of a release as a pyarrow Table"""
+    import pyarrow as pa
+
+    source = pa.memory_map(labels_path(dataset_id, version))
+    table = pa.ipc.open_file(source).read_all()
+    return table.select(columns) if columns else table
+
+
+def verify_release(dataset_id, version):
+    """Return the names of release files whose checksum does not match"""
+    manifest = get_manifest(dataset_id, version)
+    directory = release_dir(dataset_id, version)
+    return [
+        name
+        for name, info in manifest["files"].items()
+        if file_sha256(os.path.join(directory, name)) != info["sha256"]
+    ]
+
+
+def diff_releases(dataset_id, old_version, new_version):
+    """Ids added, removed and relabeled between two releases"""
+    import pyarrow.compute as pc
+
+    old_manifest = get_manifest(dataset_id, old_version)
+    new_manifest = get_manifest(dataset_id, new_version)
+    if (
+        old_manifest["files"][LABELS_FILE]["sha256"]
+        == new_manifest["files"][LABELS_FILE]["sha256"]
+    ):
+        return {"added": [], "removed": [], "changed": []}
+
+    columns = ["id"] + LABEL_COLUMNS
+    joined = load_labels(dataset_id, old_version, columns).join(
+        load_labels(dataset_id, new_version, columns),
+        keys="id",
+        join_type="full outer",
+        left_suffix="_old",
+        right_suffix="_new",
+    )
+
+    # Released rows always have an emotion, so a null one means "absent"
+    added = pc.is_null(joined["emotion_old"])
+    removed = pc.is_null(joined["emotion_new"])
+    changed = None
+    for column in LABEL_COLUMNS:
+        differs = pc.not_equal(joined[f"{column}_old"], joined[f"{column}_new"])
+        changed = differs if changed is None else pc.or_(changed, differs)
+    changed = pc.fill_null(changed, False)
+
+    def ids(mask):
+        return sorted(joined.filter(mask)["id"].to_pylist())
+
+    return {"added": ids(added), "removed": ids(removed), "changed": ids(changed)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["build", "list", "verify", "diff"])
+    parser.add_argument("versions", nargs="*", type=int)
+    parser.add_argument("--dataset", type=int, default=DEFAULT_DATASET_ID)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        manifest = build_release(args.dataset)
+        print(f"✅ Built release v{manifest['version']} with {manifest['rows']} labels")
+    elif args.command == "list":
+        for manifest in list_releases(args.dataset):
+            print(
+                f"v{manifest['version']}  {manifest['created_at']}  "
+                f"{manifest['rows']} labels"
+            )
+    elif args.command == "verify":
+        if len(args.versions) != 1:
+            parser.error("verify takes one VERSION")
+        mismatched = verify_release(args.dataset, args.versions[0])
+        if mismatched:
+            print(f"❌ Checksum mismatch: {', '.join(mismatched)}")
+            raise SystemExit(1)
+        print(f"✅ Release v{args.versions[0]} is intact")
+    else:
+        if len(args.versions) != 2:
+            parser.error("diff takes OLD and NEW versions")
+        diff = diff_releases(args.dataset, *args.versions)
+        print(
+            f"📝 +{len(diff['added'])} added, -{len(diff['removed'])} removed, "
+            f"~{len(diff['changed'])} changed"
+        )
@@ -0,0 +1,431 @@
+"""Where media files live: sharded local disks or an S3-compatible bucket.
+
+Usage:
+    python storage.py check    # round-trip a test object through the backend
+
+STORAGE_BACKEND selects "local" (UPLOAD_ROOTS) or "s3" (S3_BUCKET,
+S3_ENDPOINT_URL, S3_ACCESS_KEY, S3_SECRET_KEY, S3_REGION; without keys
+boto3 falls back to its usual AWS_* variables and config files).
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# One or more upload roots (e.g. on different disks), separated like PATH
+UPLOAD_ROOTS = [
+    root for root in os.getenv("UPLOAD_ROOTS", "uploads").split(os.pathsep) if root
+]
+
+# Two levels of 256 directories keep each directory small at millions of files
+SHARD_DEPTH = 2
+SHARD_WIDTH = 2
+
+# Datasets other than the default one get their own tree under each root,
+# <root>/datasets/<id>/ab/cd/<filename>, so uploads and scans never mix;
+# the default dataset (dataset_id=None here) keeps the original layout
+DATASETS_DIR = "datasets"
+
+
+def shard_key(filename):
+    return hashlib.sha1(filename.encode("utf-8")).hexdigest()
+
+
+def shard_parts(filename):
+    """Hash-prefix directories for a file, e.g. ["ab", "cd"]"""
+    key = shard_key(filename)
+    return [key[i * SHARD_WIDTH : (i + 1) * SHARD_WIDTH] for i in range(SHARD_DEPTH)]
+
+
+def root_for(filename, roots=None):
+    """Pick the storage root for a file; stable for a fixed list of roots"""
+    roots = roots or UPLOAD_ROOTS
+    return roots[int(shard_key(filename)[:8], 16) % len(roots)]
+
+
+def dataset_parts(dataset_id=None):
+    """Directory/key prefix of a dataset's files, e.g. ["datasets", "2"]"""
+    return [] if dataset_id is None else [DATASETS_DIR, str(dataset_id)]
+
+
+def path_for(filename, roots=None, dataset_id=None):
+    """Sharded path of a file: <root>/[datasets/<id>/]ab/cd/<filename>"""
+    return os.path.join(
+        root_for(filename, roots),
+        *dataset_parts(dataset_id),
+        *shard_parts(filename),
+        filename,
+    )
+
+
+def prepare_path(filename, roots=None, dataset_id=None):
+    """Return the sharded path for a new file, creating its directory"""
+    filepath = path_for(filename, roots, dataset_id)
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    return filepath
+
+
+def iter_files(roots=None, dataset_id=None):
+    """Yield (filename, filepath) for every file of a dataset under the roots.
+
+    Walks the shard directories with scandir and also yields legacy files
+    still sitting flat in a root, so scans work before and after migration.
+    """
+    for root in roots or UPLOAD_ROOTS:
+        top = os.path.join(root, *dataset_parts(dataset_id))
+        if not os.path.isdir(top):
+            continue
+        stack = [(top, 0)]
+        while stack:
+            directory, depth = stack.pop()
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.name.startswith("."):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        # Other datasets' trees are not part of the default one
+                        if depth == 0 and entry.name == DATASETS_DIR:
+                            continue
+                        if depth < SHARD_DEPTH:
+                            stack.append((entry.path, depth + 1))
+                    elif entry.is_file():
+                        yield entry.name, entry.path
+
+
+class LocalStorage:
+    """Media files on local disks under the sharded upload roots"""
+
+    name = "local"
+
+    def __init__(self, roots=None):
+        self.roots = roots or UPLOAD_ROOTS
+
+    def staging_path(self, filename, dataset_id=None):
+        """Local path a new upload is written to before commit()"""
+        return prepare_path(filename, self.roots, dataset_id)
+
+    def commit(self, filename, local_path, dataset_id=None):
+        """Finish storing a staged file; returns the filepath kept in the DB"""
+        return local_path
+
+    def iter_files(self, dataset_id=None):
+        return iter_files(self.roots, dataset_id)
+
+    def exists(self, filepath):
+        return os.path.exists(filepath)
+
+    def local_path(self, filepath):
+        return filepath if os.path.exists(filepath) else None
+
+    def local_paths(self, filepaths):
+        return list(filepaths)
+
+    def presigned_url(self, filepath):
+        return None
+
+    def delete(self, filepath):
+        if os.path.exists(filepath):
+            os.remove(filepath)
+
+
+class DiskCache:
+    """Read-through LRU cache of remote objects on local disk"""
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        # Bytes per cached path, loaded from disk on first use; re-adding a
+        # path replaces its size instead of counting it twice
+        self.sizes = None
+        self.size = 0
+
+    def path_for(self, key):
+        digest = shard_key(key)
+        ext = os.path.splitext(key)[1]
+        return os.path.join(self.directory, digest[:2], digest + ext)
+
+    def _entries(self):
+        for directory, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                yield path, stat
+
+    def fetch(self, key, download):
+        """Return a local copy of key, calling download(path) on a miss"""
+        path = self.path_for(key)
+        if os.path.exists(path):
+            # Bump mtime so eviction treats the object as recently used
+            os.utime(path)
+            return path
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = f"{path}.{threading.get_ident()}.part"
+        try:
+            download(partial)
+            os.replace(partial, path)
+        except Exception:
+            if os.path.exists(partial):
+                os.remove(partial)
+            raise
+        self.add(path)
+        return path
+
+    def _load_sizes(self):
+        if self.sizes is None:
+            self.sizes = {path: stat.st_size for path, stat in self._entries()}
+            self.size = sum(self.sizes.values())
+
+    def _forget(self, path):
+        self.size -= self.sizes.pop(path, 0)
+
+    def add(self, path):
+        """Account for a file placed in the cache and evict if over budget"""
+        with self.lock:
+            self._load_sizes()
+            self._forget(path)
+            self.sizes[path] = os.path.getsize(path)
+            self.size += self.sizes[path]
+            if self.size <= self.max_bytes:
+                return
+            entries = sorted(self._entries(), key=lambda entry: entry[1].st_mtime)
+            for old_path, _ in entries:
+                if self.size <= self.max_bytes * 0.9:
+                    break
+                if old_path == path:
+                    continue
+                try:
+                    os.remove(old_path)
+                except OSError:
+                    continue
+                self._forget(old_path)
+
+    def remove(self, key):
+        """Drop the cached copy of key, if any"""
+        path = self.path_for(key)
+        with self.lock:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            if self.sizes is not None:
+                self._forget(path)
+
+
+class S3Storage:
+    """Media files in an S3-compatible bucket (AWS S3, MinIO, ...)"""
+
+    name = "s3"
+
+    def __init__(
+        self,
+        bucket,
+        prefix="",
+        endpoint_url=None,
+        cache=None,
+        presign=True,
+        presign_expiry=3600,
+        multipart_threshold=8 * 1024 * 1024,
+        max_concurrency=8,
+        access_key=None,
+        secret_key=None,
+        region=None,
+    ):
+        self.bucket = bucket
+        self.prefix = prefix.strip("/")
+        self.endpoint_url = endpoint_url
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.region = region
+        self.cache = cache
+        self.presign = presign
+        self.presign_expiry = presign_expiry
+        self.multipart_threshold = multipart_threshold
+        self.max_concurrency = max_concurrency
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client(
+                "s3",
+                endpoint_url=self.endpoint_url,
+                aws_access_key_id=self.access_key,
+                aws_secret_access_key=self.secret_key,
+                region_name=self.region,
+            )
+        return self._client
+
+    def key_prefix(self, dataset_id=None):
+        return "".join(
+            f"{part}/"
+            for part in ([self.prefix] if self.prefix else [])
+            + dataset_parts(dataset_id)
+        )
+
+    def key_for(self, filename, dataset_id=None):
+        return self.key_prefix(dataset_id) + "/".join(
+            shard_parts(filename) + [filename]
+        )
+
+    def staging_path(self, filename, dataset_id=None):
+        # Stage uploads straight into the read cache: they are hot right after
+        path = self.cache.path_for(self.key_for(filename, dataset_id))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def commit(self, filename, local_path, dataset_id=None):
+        from boto3.s3.transfer import TransferConfig
+
+        key = self.key_for(filename, dataset_id)
+        config = TransferConfig(
+            multipart_threshold=self.multipart_threshold,
+            multipart_chunksize=self.multipart_threshold,
+            max_concurrency=self.max_concurrency,
+            use_threads=True,
+        )
+        self.client.upload_file(local_path, self.bucket, key, Config=config)
+        self.cache.add(local_path)
+        return key
+
+    def iter_files(self, dataset_id=None):
+        paginator = self.client.get_paginator("list_objects_v2")
+        prefix = self.key_prefix(dataset_id)
+        # Keys of other datasets share the default dataset's prefix
+        other_datasets = self.key_prefix() + f"{DATASETS_DIR}/"
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                if dataset_id is None and obj["Key"].startswith(other_datasets):
+                    continue
+                yield obj["Key"].rsplit("/", 1)[-1], obj["Key"]
+
+    def exists(self, filepath):
+        from botocore.exceptions import ClientError
+
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=filepath)
+            return True
+        except ClientError:
+            return False
+
+    def local_path(self, filepath):
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.cache.fetch(
+                filepath,
+                lambda path: self.client.download_file(self.bucket, filepath, path),
+            )
+        except ClientError:
+            return None
+
+    def local_paths(self, filepaths):
+        """Pull many objects into the cache in parallel (used by scans)"""
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(pool.map(self.local_path, filepaths))
+
+    def presigned_url(self, filepath):
+        if not self.presign:
+            return None
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": filepath},
+            ExpiresIn=self.presign_expiry,
+        )
+
+    def delete(self, filepath):
+        self.client.delete_object(Bucket=self.bucket, Key=filepath)
+        self.cache.remove(filepath)
+
+
+def create_storage():
+    """Build the storage backend selected by STORAGE_BACKEND"""
+    backend = os.getenv("STORAGE_BACKEND", "local")
+    if backend == "local":
+        return LocalStorage()
+    if backend == "s3":
+        cache = DiskCache(
+            os.getenv("MEDIA_CACHE_DIR", "media_cache"),
+            int(os.getenv("MEDIA_CACHE_BYTES", str(10 * 1024**3))),
+        )
+        return S3Storage(
+            bucket=os.environ["S3_BUCKET"],
+            prefix=os.getenv("S3_PREFIX", ""),
+            endpoint_url=os.getenv("S3_ENDPOINT_URL") or None,
+            cache=cache,
+            presign=os.getenv("S3_PRESIGN", "1") == "1",
+            presign_expiry=int(os.getenv("S3_PRESIGN_EXPIRY", "3600")),
+            access_key=os.getenv("S3_ACCESS_KEY") or None,
+            secret_key=os.getenv("S3_SECRET_KEY") or None,
+            region=os.getenv("S3_REGION") or None,
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+def check_storage(storage):
+    """Store, list, read back, presign and delete a test object.
+
+    Yields a description of each step that passed; raises on the first
+    failure. The object goes into the default dataset's tree.
+    """
+    from urllib.request import urlopen
+
+    filename = f".storage-check-{uuid.uuid4().hex}.txt"
+    payload = filename.encode("utf-8")
+    staged = storage.staging_path(filename)
+    with open(staged, "wb") as f:
+        f.write(payload)
+    filepath = storage.commit(filename, staged)
+    try:
+        yield f"stored {filepath}"
+        if not storage.exists(filepath):
+            raise RuntimeError(f"{filepath} not found after storing it")
+        yield "found it again"
+        if getattr(storage, "cache", None) and os.path.exists(staged):
+            # Force a real download instead of reading the staged copy
+            os.remove(staged)
+        local = storage.local_path(filepath)
+        with open(local, "rb") as f:
+            if f.read() != payload:
+                raise RuntimeError(f"{filepath} came back with different content")
+        yield "read it back"
+        url = storage.presigned_url(filepath)
+        if url:
+            with urlopen(url, timeout=10) as response:
+                if response.read() != payload:
+                    raise RuntimeError("presigned URL served different content")
+            yield "fetched it through a presigned URL"
+    finally:
+        storage.delete(filepath)
+    if storage.exists(filepath):
+        raise RuntimeError(f"{filepath} still exists after deleting it")
+    yield "deleted it"
+
+
+# Storage singleton
+media_storage = create_storage()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["check"])
+    parser.parse_args()
+
+    print(f"🔍 Checking {media_storage.name} storage")
+    try:
+        for step in check_storage(media_storage):
+            print(f"  ✅ {step}")
+    except Exception as e:
+        print(f"  ❌ {e}")
+        raise SystemExit(1)
+    print("✅ Storage is working")
@@ -0,0 +1,127 @@
+import admission
+from admission import Admission, HIGH, LOW, RateLimiter, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(admission.time, "monotonic", clock)
+    return clock
+
+
+def test_bucket_allows_burst_then_waits(monkeypatch):
+    make_clock(monkeypatch)
+    bucket = TokenBucket(rate=2, burst=3)
+    assert [bucket.take() for _ in range(3)] == [0, 0, 0]
+    assert bucket.take() == 0.5
+
+
+def test_bucket_refills_at_rate(monkeypatch):
+    clock = make_clock(monkeypatch)
+    bucket = TokenBucket(rate=2, burst=3)
+    for _ in range(3):
+        bucket.take()
+    clock.now += 0.5
+    assert bucket.take() == 0
+    assert bucket.take() == 0.5
+
+
+def test_bucket_never_exceeds_burst(monkeypatch):
+    clock = make_clock(monkeypatch)
+    bucket = TokenBucket(rate=10, burst=2)
+    clock.now += 60
+    assert [bucket.take() for _ in range(2)] == [0, 0]
+    assert bucket.take() > 0
+
+
+def test_rate_limiter_keys_are_independent(monkeypatch):
+    make_clock(monkeypatch)
+    limiter = RateLimiter(rate=1, burst=1)
+    assert limiter.check("a") == 0
+    assert limiter.check("a") > 0
+    assert limiter.check("b") == 0
+
+
+def test_rate_limiter_drops_least_recent_client(monkeypatch):
+    make_clock(monkeypatch)
+    limiter = RateLimiter(rate=1, burst=1, max_clients=2)
+    limiter.check("a")
+    limiter.check("b")
+    limiter.check("a")
+    limiter.check("c")
+    assert list(limiter.buckets) == ["a", "c"]
+
+
+def test_low_priority_leaves_reserved_slots():
+    budget = Admission(capacity=3, reserved=1)
+    assert budget.enter(LOW, 0) and budget.enter(LOW, 0)
+    assert not budget.enter(LOW, 0)
+    assert budget.enter(HIGH, 0)
+    budget.leave()
+    assert not budget.enter(LOW, 0)
+    budget.leave()
+    assert budget.enter(LOW, 0)
+
+
+def test_default_low_caps_exceed_low_budget():
+    caps = sum(
+        policy.concurrency or 0
+        for policy in admission.POLICIES.values()
+        if policy.priority == LOW
+    )
+    assert caps > admission.admission.capacity - admission.admission.reserved
+
+
+def limited_app(monkeypatch, **policy):
+    from flask import Flask
+
+    make_clock(monkeypatch)
+    monkeypatch.setitem(admission.POLICIES, "test", admission.Policy(**policy))
+    app = Flask(__name__)
+
+    @app.route("/write", methods=["POST"])
+    @admission.limited("test")
+    def write():
+        return "ok"
+
+    return app.test_client()
+
+
+def test_new_identity_per_request_hits_address_limit(monkeypatch):
+    client = limited_app(
+        monkeypatch,
+        rate=1,
+        burst=3,
+        identity=admission.annotator_identity,
+        identity_rate=1,
+        identity_burst=2,
+    )
+    statuses = [
+        client.post("/write", headers={"X-Session-Id": f"s{n}"}).status_code
+        for n in range(5)
+    ]
+    assert statuses == [200, 200, 200, 429, 429]
+
+
+def test_identity_bucket_splits_an_address(monkeypatch):
+    client = limited_app(
+        monkeypatch,
+        rate=1,
+        burst=10,
+        identity=admission.annotator_identity,
+        identity_rate=1,
+        identity_burst=2,
+    )
+    alice = [
+        client.post("/write", json={"annotator": "alice"}).status_code for _ in range(3)
+    ]
+    bob = client.post("/write", json={"annotator": "bob"}).status_code
+    assert alice == [200, 200, 429]
+    assert bob == 200
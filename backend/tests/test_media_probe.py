@@ -0,0 +1,111 @@
+import struct
+
+from media_probe import probe_avi, probe_file, probe_mp4
+
+
+def box(box_type, payload=b""):
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def mvhd(timescale, duration):
+    # version/flags, creation and modification times, then timescale and duration
+    return box(b"mvhd", struct.pack(">I II II", 0, 0, 0, timescale, duration))
+
+
+def tkhd(width, height):
+    # Version 0: dimensions are 16.16 fixed point at offset 76
+    return box(b"tkhd", bytes(76) + struct.pack(">II", width << 16, height << 16))
+
+
+def trak(handler, codec, frames, width=0, height=0):
+    stbl = box(
+        b"stbl",
+        box(b"stsd", bytes(12) + codec)
+        + box(b"stsz", struct.pack(">III", 0, 0, frames)),
+    )
+    mdia = box(
+        b"mdia",
+        box(b"mdhd", struct.pack(">I II II", 0, 0, 0, 1000, 5000))
+        + box(b"hdlr", bytes(8) + handler)
+        + box(b"minf", stbl),
+    )
+    return box(b"trak", tkhd(width, height) + mdia)
+
+
+def write_mp4(path, moov_payload, mdat_first=True):
+    moov = box(b"moov", moov_payload)
+    mdat = box(b"mdat", bytes(64))
+    with open(path, "wb") as f:
+        f.write(box(b"ftyp", b"isom") + (mdat + moov if mdat_first else moov + mdat))
+
+
+def test_probe_mp4_reads_video_track(tmp_path):
+    path = tmp_path / "clip.mp4"
+    write_mp4(
+        path,
+        mvhd(600, 1800)
+        + trak(b"soun", b"mp4a", 99)
+        + trak(b"vide", b"avc1", 75, 1280, 720),
+    )
+    metadata = probe_mp4(str(path))
+    assert metadata["duration"] == 3.0
+    assert (metadata["width"], metadata["height"]) == (1280, 720)
+    assert metadata["codec"] == "avc1"
+    assert metadata["frame_count"] == 75
+
+
+def test_probe_mp4_falls_back_to_track_duration(tmp_path):
+    path = tmp_path / "clip.mov"
+    write_mp4(path, trak(b"vide", b"hvc1", 10, 640, 480), mdat_first=False)
+    assert probe_mp4(str(path))["duration"] == 5.0
+
+
+def test_probe_mp4_without_moov(tmp_path):
+    path = tmp_path / "broken.mp4"
+    path.write_bytes(box(b"ftyp", b"isom") + box(b"mdat", bytes(16)))
+    metadata = probe_mp4(str(path))
+    assert metadata["width"] is None and metadata["duration"] is None
+
+
+def chunk(chunk_id, payload):
+    data = struct.pack("<4sI", chunk_id, len(payload)) + payload
+    return data + (b"\x00" if len(payload) % 2 else b"")
+
+
+def write_avi(path, usec_per_frame, frames, width, height, handler):
+    avih = chunk(
+        b"avih",
+        struct.pack("<5I", usec_per_frame, 0, 0, 0, frames)
+        + bytes(12)
+        + struct.pack("<II", width, height)
+        + bytes(16),
+    )
+    strh = chunk(b"strh", struct.pack("<4s4s", b"vids", handler) + bytes(48))
+    strl = chunk(b"LIST", b"strl" + strh)
+    hdrl = b"hdrl" + avih + strl
+    body = b"AVI " + struct.pack("<4sI", b"LIST", len(hdrl)) + hdrl
+    with open(path, "wb") as f:
+        f.write(struct.pack("<4sI", b"RIFF", len(body)) + body)
+
+
+def test_probe_avi_reads_headers(tmp_path):
+    path = tmp_path / "clip.avi"
+    write_avi(path, 40_000, 250, 320, 240, b"XVID")
+    metadata = probe_avi(str(path))
+    assert (metadata["width"], metadata["height"]) == (320, 240)
+    assert metadata["frame_count"] == 250
+    assert metadata["duration"] == 10.0
+    assert metadata["codec"] == "XVID"
+
+
+def test_probe_avi_rejects_other_riff(tmp_path):
+    path = tmp_path / "sound.avi"
+    path.write_bytes(b"RIFF" + struct.pack("<I", 4) + b"WAVE")
+    assert probe_avi(str(path))["width"] is None
+
+
+def test_probe_file_never_raises(tmp_path):
+    path = tmp_path / "truncated.mp4"
+    path.write_bytes(box(b"moov", mvhd(600, 1800))[:20])
+    metadata = probe_file(str(path))
+    assert metadata["file_size"] == 20
@@ -0,0 +1,61 @@
+import random
+from math import comb
+
+from phash import (
+    BAND_BITS,
+    HASH_BANDS,
+    MAX_DISTANCE,
+    MAX_PROBE_RADIUS,
+    band_neighbours,
+    bands,
+    probe_bands,
+)
+
+HASH_BITS = HASH_BANDS * BAND_BITS
+
+
+def found(value, other, max_distance):
+    # Mirrors the lookup: a candidate matches if any of its bands is probed
+    probes = probe_bands(value, max_distance)
+    return any(band in probe for band, probe in zip(bands(other), probes))
+
+
+def flip(value, positions):
+    for position in positions:
+        value ^= 1 << position
+    return value
+
+
+def test_band_neighbours_are_exactly_the_hamming_ball():
+    for radius in range(MAX_PROBE_RADIUS + 1):
+        values = band_neighbours(0b1010, radius)
+        assert len(values) == len(set(values))
+        assert len(values) == sum(comb(BAND_BITS, k) for k in range(radius + 1))
+        assert all(bin(v ^ 0b1010).count("1") <= radius for v in values)
+
+
+def test_every_hash_within_max_distance_is_found():
+    rng = random.Random(1234)
+    for _ in range(2000):
+        value = rng.getrandbits(HASH_BITS)
+        max_distance = rng.randint(0, MAX_DISTANCE)
+        distance = rng.randint(0, max_distance)
+        other = flip(value, rng.sample(range(HASH_BITS), distance))
+        assert found(value, other, max_distance)
+
+
+def test_flips_spread_evenly_over_bands_are_found():
+    # Worst case for banding: no band keeps fewer differing bits than needed
+    rng = random.Random(99)
+    for max_distance in range(MAX_DISTANCE + 1):
+        per_band = [max_distance // HASH_BANDS] * HASH_BANDS
+        for i in range(max_distance % HASH_BANDS):
+            per_band[i] += 1
+        for _ in range(50):
+            value = rng.getrandbits(HASH_BITS)
+            positions = [
+                i * BAND_BITS + bit
+                for i, count in enumerate(per_band)
+                for bit in rng.sample(range(BAND_BITS), count)
+            ]
+            assert found(value, flip(value, positions), max_distance)
@@ -0,0 +1,94 @@
+import io
+
+import pytest
+
+from predictions import STAGING_COLUMNS, CopyStream, iter_jsonl, to_row
+
+
+def fields(row):
+    assert row.endswith("\n")
+    values = row[:-1].split("\t")
+    assert len(values) == len(STAGING_COLUMNS)
+    return dict(zip(STAGING_COLUMNS, values))
+
+
+def test_to_row_flattens_scores_and_nulls_missing_values():
+    row = fields(to_row({"media_id": 7, "scores": {"happy": 0.9}, "valence": 0.5}))
+    assert row["media_id"] == "7"
+    assert row["filename"] == "\\N"
+    assert row["score_happy"] == "0.9"
+    assert row["score_sad"] == "\\N"
+    assert row["valence"] == "0.5"
+    assert row["arousal"] == "\\N"
+
+
+def test_to_row_reads_flat_score_columns():
+    row = fields(to_row({"filename": "a.jpg", "score_fear": 0.4}))
+    assert row["filename"] == "a.jpg"
+    assert row["score_fear"] == "0.4"
+
+
+def test_to_row_escapes_copy_text():
+    row = fields(to_row({"filename": "a\tb\\c.jpg"}))
+    assert row["filename"] == "a\\tb\\\\c.jpg"
+
+
+@pytest.mark.parametrize(
+    "record, message",
+    [
+        ([1, 2], "must be an object"),
+        ({"media_id": 1, "scores": [0.9]}, "scores must be an object"),
+        ({"media_id": "7"}, "media_id must be an integer"),
+        ({"media_id": True}, "media_id must be an integer"),
+        ({"scores": {"happy": 0.9}}, "needs a media_id or a filename"),
+        ({"filename": 3}, "needs a media_id or a filename"),
+        ({"media_id": 1, "scores": {"happy": "high"}}, "score happy must be a number"),
+        ({"media_id": 1, "valence": False}, "valence must be a number"),
+        ({"media_id": 1, "dominance": [0.1]}, "dominance must be a number"),
+    ],
+)
+def test_to_row_rejects_invalid_records(record, message):
+    with pytest.raises(ValueError, match=message):
+        to_row(record)
+
+
+def test_copy_stream_serves_every_row_in_small_chunks():
+    records = [{"media_id": i, "scores": {"sad": 0.1}} for i in range(50)]
+    stream = CopyStream(records)
+    chunks = []
+    while True:
+        chunk = stream.read(64)
+        if not chunk:
+            break
+        assert len(chunk) <= 64
+        chunks.append(chunk)
+    assert "".join(chunks) == "".join(to_row(record) for record in records)
+    assert stream.count == 50
+    assert stream.error is None
+
+
+def test_copy_stream_stops_at_the_first_bad_record():
+    consumed = []
+
+    def records():
+        for record in [{"media_id": 1}, {"media_id": 2}, {"media_id": "x"}]:
+            consumed.append(record)
+            yield record
+        consumed.append("past the bad record")
+        yield {"media_id": 4}
+
+    stream = CopyStream(records())
+    assert stream.read() == ""
+    assert stream.read() == ""
+    assert stream.count == 2
+    assert isinstance(stream.error, ValueError)
+    assert str(stream.error) == "record 3: media_id must be an integer"
+    assert "past the bad record" not in consumed
+
+
+def test_copy_stream_reports_unparsable_jsonl_lines():
+    data = io.BytesIO(b'{"media_id": 1}\n\n{"media_id": \n')
+    stream = CopyStream(iter_jsonl(data))
+    stream.read()
+    assert stream.count == 1
+    assert str(stream.error).startswith("record 2: ")
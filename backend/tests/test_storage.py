@@ -0,0 +1,39 @@
+import os
+
+from storage import DiskCache
+
+
+def stage(cache, key, size):
+    path = cache.path_for(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    cache.add(path)
+    return path
+
+
+def test_restaging_a_path_replaces_its_size(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10_000)
+    stage(cache, "a.jpg", 100)
+    stage(cache, "a.jpg", 300)
+    stage(cache, "b.jpg", 50)
+    assert cache.size == 350
+
+
+def test_remove_subtracts_the_cached_copy(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10_000)
+    path = stage(cache, "a.jpg", 100)
+    stage(cache, "b.jpg", 50)
+    cache.remove("a.jpg")
+    cache.remove("missing.jpg")
+    assert cache.size == 50
+    assert path not in cache.sizes
+
+
+def test_eviction_keeps_the_new_file_and_the_budget(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=1_000)
+    for i in range(5):
+        stage(cache, f"{i}.jpg", 300)
+    assert cache.size <= 1_000
+    assert cache.size == sum(cache.sizes.values())
+    assert cache.path_for("4.jpg") in cache.sizes
@@ -0,0 +1,47 @@
+import math
+
+from traces import TRACE_SCALE, decode_trace, encode_trace, resample
+
+
+def test_round_trip_within_quantization():
+    values = [math.sin(i / 10) * 0.99 for i in range(500)]
+    decoded = decode_trace(encode_trace(values))
+    assert len(decoded) == len(values)
+    assert all(abs(a - b) <= 0.5 / TRACE_SCALE for a, b in zip(values, decoded))
+
+
+def test_round_trip_extremes_and_empty():
+    assert decode_trace(encode_trace([-1.0, 1.0, -1.0, 0.0])) == [-1.0, 1.0, -1.0, 0.0]
+    assert decode_trace(encode_trace([])) == []
+
+
+def test_constant_trace_compresses():
+    assert len(encode_trace([0.25] * 10_000)) < 200
+
+
+def test_resample_same_rate_is_a_copy():
+    values = [0.1, 0.2, 0.3]
+    result = resample(values, 10, 10)
+    assert result == values and result is not values
+
+
+def test_downsample_averages_windows():
+    # 10 Hz -> 2 Hz: each output sample averages five inputs
+    values = [0.0] * 5 + [1.0] * 5
+    assert resample(values, 10, 2) == [0.0, 1.0]
+
+
+def test_downsample_keeps_short_peaks():
+    values = [0.0] * 10
+    values[3] = 1.0
+    assert resample(values, 10, 1) == [0.1]
+
+
+def test_upsample_interpolates():
+    assert resample([0.0, 1.0], 1, 4) == [0.0, 0.25, 0.5, 0.75, 1.0, 1.0, 1.0, 1.0]
+
+
+def test_resample_keeps_duration():
+    values = [0.5] * 300  # 10 s at 30 Hz
+    assert len(resample(values, 30, 4)) == 40
+    assert len(resample(values, 30, 60)) == 600
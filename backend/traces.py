@@ -0,0 +1,61 @@
+import math
+import zlib
+from array import array
+
+# Valence/arousal live in [-1, 1]; 1e-4 steps keep quantized values in int16
+TRACE_SCALE = 10000
+
+
+def encode_trace(values):
+    """Quantize, delta-encode and compress a float trace into bytes"""
+    deltas = array("h")
+    previous = 0
+    for value in values:
+        quantized = int(round(float(value) * TRACE_SCALE))
+        deltas.append(quantized - previous)
+        previous = quantized
+    return zlib.compress(deltas.tobytes())
+
+
+def decode_trace(data):
+    """Inverse of encode_trace: returns the list of float samples"""
+    deltas = array("h")
+    deltas.frombytes(zlib.decompress(bytes(data)))
+    values = []
+    current = 0
+    for delta in deltas:
+        current += delta
+        values.append(current / TRACE_SCALE)
+    return values
+
+
+def resample(values, sample_rate, target_rate):
+    """Resample a trace to target_rate Hz.
+
+    Downsampling averages each output window so short peaks are not
+    aliased away; upsampling interpolates linearly between samples.
+    """
+    if not values or target_rate <= 0 or target_rate == sample_rate:
+        return list(values)
+
+    duration = len(values) / sample_rate
+    count = max(1, int(math.ceil(duration * target_rate)))
+    step = sample_rate / target_rate
+
+    resampled = []
+    if target_rate < sample_rate:
+        for i in range(count):
+            start = int(i * step)
+            end = min(len(values), max(start + 1, int((i + 1) * step)))
+            window = values[start:end]
+            resampled.append(round(sum(window) / len(window), 4))
+    else:
+        last = len(values) - 1
+        for i in range(count):
+            position = min(i * step, last)
+            left = int(position)
+            right = min(left + 1, last)
+            fraction = position - left
+            value = values[left] + (values[right] - values[left]) * fraction
+            resampled.append(round(float(value), 4))
+    return resampled
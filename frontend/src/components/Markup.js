@@ -1,4 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
+import { useLocalStorage } from '../hooks/useLocalStorage';
+import { STORAGE_KEYS } from '../utils/constants';
+import { annotatorIdentity } from '../utils/helpers';
 
 const Markup = ({ mediaItems, onBack }) => {
   const [currentIndex, setCurrentIndex] = useState(0);
@@ -6,6 +9,21 @@ const Markup = ({ mediaItems, onBack }) => {
   const [vadValues, setVadValues] = useState({});
   const [stats, setStats] = useState(null);
   const [error, setError] = useState('');
+  const [annotator] = useLocalStorage(STORAGE_KEYS.ANNOTATOR, '');
+  // Last label version seen per item, sent back for conflict detection
+  const versions = useRef({});
+  // Emotion the server last confirmed per item, so the distribution counts
+  // can follow saves without refetching the (cached) dataset stats
+  const savedTags = useRef({});
+  // Saves of one item run one after another, each sending the version the
+  // previous one returned, so an annotator's own saves never conflict
+  const saveChains = useRef({});
+  // Pending debounced VAD saves per item
+  const vadTimers = useRef({});
+  // When the current item was shown, or last saved/skipped, for time on item
+  const shownAt = useRef({ index: null, at: 0 });
+
+  const VAD_SAVE_DELAY_MS = 500;
 
   const tags = ['angry', 'sad', 'neutral', 'happy', 'disgust', 'surprise', 'fear'];
 
@@ -13,6 +31,64 @@ const Markup = ({ mediaItems, onBack }) => {
     loadStats();
   }, []);
 
+  const currentItemId = mediaItems[currentIndex]?.id;
+
+  useEffect(() => {
+    if (currentItemId === undefined) return;
+    shownAt.current = { index: currentIndex, at: Date.now() };
+    postEvent('/api/view', { mediaId: currentItemId });
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [currentIndex, currentItemId]);
+
+  // Milliseconds spent on an item since it was shown or last acted on;
+  // null when the item is no longer on screen
+  const takeTimeOnItem = (itemIndex) => {
+    if (shownAt.current.index !== itemIndex) return null;
+    const now = Date.now();
+    const elapsed = now - shownAt.current.at;
+    shownAt.current = { index: itemIndex, at: now };
+    return elapsed;
+  };
+
+  // Analytics events are best effort and never bother the annotator
+  const postEvent = (url, body) => {
+    fetch(url, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ ...body, ...annotatorIdentity(annotator) })
+    }).catch(error => console.error('Failed to record event:', error));
+  };
+
+  const isAnnotated = (index) =>
+    Boolean(markups[index])
+    && vadValues[index]?.valence != null && vadValues[index]?.valence !== ''
+    && vadValues[index]?.arousal != null && vadValues[index]?.arousal !== '';
+
+  const savedTag = (itemIndex) =>
+    itemIndex in savedTags.current
+      ? savedTags.current[itemIndex]
+      : mediaItems[itemIndex].emotion ?? null;
+
+  // Move one item's count in the emotion distribution from its old label to
+  // its new one
+  const moveEmotionCount = (itemIndex, emotion) => {
+    const from = savedTag(itemIndex);
+    savedTags.current[itemIndex] = emotion;
+    if (from === emotion) return;
+    setStats(prev => {
+      if (!prev) return prev;
+      const summary = { ...(prev.emotion_summary || {}) };
+      if (from) {
+        summary[from] = (summary[from] || 0) - 1;
+        if (summary[from] <= 0) delete summary[from];
+      }
+      if (emotion) {
+        summary[emotion] = (summary[emotion] || 0) + 1;
+      }
+      return { ...prev, emotion_summary: summary };
+    });
+  };
+
   const loadStats = async () => {
     try {
       const response = await fetch('/api/stats');
@@ -35,7 +111,7 @@ const Markup = ({ mediaItems, onBack }) => {
     markups[key] && vadValues[key]?.valence !== undefined && vadValues[key]?.arousal !== undefined
   ).length;
 
-  const saveAnnotation = async (itemIndex, tag, valence, arousal) => {
+  const saveAnnotation = (itemIndex, tag, valence, arousal) => {
     setError('');
 
     // Update local state
@@ -52,6 +128,16 @@ const Markup = ({ mediaItems, onBack }) => {
       }
     }));
 
+    const timeOnItemMs = takeTimeOnItem(itemIndex);
+    const previous = saveChains.current[itemIndex] || Promise.resolve();
+    const next = previous.then(() =>
+      sendAnnotation(itemIndex, tag, valence, arousal, timeOnItemMs)
+    );
+    saveChains.current[itemIndex] = next;
+    return next;
+  };
+
+  const sendAnnotation = async (itemIndex, tag, valence, arousal, timeOnItemMs) => {
     try {
       const response = await fetch('/api/annotate', {
         method: 'POST',
@@ -62,13 +148,24 @@ const Markup = ({ mediaItems, onBack }) => {
           mediaId: mediaItems[itemIndex].id,
           tag: tag || null,
           valence: valence || null,
-          arousal: arousal || null
+          arousal: arousal || null,
+          version: versions.current[itemIndex] ?? mediaItems[itemIndex].version,
+          timeOnItemMs,
+          ...annotatorIdentity(annotator)
         })
       });
 
       if (response.ok) {
         const data = await response.json();
-        setStats(data.stats);
+        moveEmotionCount(itemIndex, data.result.emotion);
+        versions.current[itemIndex] = data.result.version;
+      } else if (response.status === 409) {
+        // Someone else labeled the item: keep the annotator's input on screen,
+        // saving again deliberately overwrites the newer labels
+        const errorData = await response.json();
+        setError(errorData.error || 'Media was updated by someone else');
+        versions.current[itemIndex] = errorData.current.version;
+        moveEmotionCount(itemIndex, errorData.current.emotion);
       } else {
         const errorData = await response.json();
         setError(errorData.error || 'Failed to save annotation');
@@ -103,6 +200,12 @@ const Markup = ({ mediaItems, onBack }) => {
 
   const goToNext = () => {
     if (currentIndex < mediaItems.length - 1) {
+      if (!isAnnotated(currentIndex)) {
+        postEvent('/api/skip', {
+          mediaId: mediaItems[currentIndex].id,
+          timeOnItemMs: takeTimeOnItem(currentIndex)
+        });
+      }
       setCurrentIndex(prev => prev + 1);
       setError('');
     }
@@ -124,26 +227,36 @@ const Markup = ({ mediaItems, onBack }) => {
     }
   };
 
+  const cancelVadSave = (itemIndex) => {
+    clearTimeout(vadTimers.current[itemIndex]);
+    delete vadTimers.current[itemIndex];
+  };
+
   const handleTagClick = (tag) => {
+    // This save already carries the typed VAD values
+    cancelVadSave(currentIndex);
     saveAnnotation(currentIndex, tag, currentValence, currentArousal);
   };
 
   const handleVadChange = (type, value) => {
+    const itemIndex = currentIndex;
+    const newValence = type === 'valence' ? value : currentValence;
+    const newArousal = type === 'arousal' ? value : currentArousal;
+
+    // Update local state right away; the server only sees the value once
+    // typing pauses
+    setVadValues(prev => ({
+      ...prev,
+      [itemIndex]: { valence: newValence, arousal: newArousal }
+    }));
+    cancelVadSave(itemIndex);
+
     const numValue = parseFloat(value);
     if (value === '' || (!isNaN(numValue) && numValue >= -1 && numValue <= 1)) {
-      const newValence = type === 'valence' ? value : currentValence;
-      const newArousal = type === 'arousal' ? value : currentArousal;
-
-      saveAnnotation(currentIndex, currentTag, newValence, newArousal);
-    } else {
-      // Update local state but don't save to server yet
-      setVadValues(prev => ({
-        ...prev,
-        [currentIndex]: {
-          valence: type === 'valence' ? value : currentValence,
-          arousal: type === 'arousal' ? value : currentArousal
-        }
-      }));
+      vadTimers.current[itemIndex] = setTimeout(() => {
+        delete vadTimers.current[itemIndex];
+        saveAnnotation(itemIndex, currentTag, newValence, newArousal);
+      }, VAD_SAVE_DELAY_MS);
     }
   };
 
@@ -170,19 +283,50 @@ const Markup = ({ mediaItems, onBack }) => {
     }
   };
 
+  const reloadVersions = async () => {
+    try {
+      const response = await fetch('/api/media');
+      if (!response.ok) {
+        throw new Error('Failed to fetch media');
+      }
+      const data = await response.json();
+      const byId = {};
+      (data.items || []).forEach(item => {
+        byId[item.id] = item.version;
+      });
+      const fresh = {};
+      mediaItems.forEach((item, index) => {
+        if (byId[item.id] !== undefined) {
+          fresh[index] = byId[item.id];
+        }
+      });
+      versions.current = fresh;
+    } catch (error) {
+      // Keep the old versions: the next save gets a 409 with the current one
+      console.error('Failed to reload versions:', error);
+      setError('Could not reload media after reset; the first save may need a retry.');
+    }
+  };
+
   const handleReset = async () => {
     if (window.confirm('Are you sure you want to reset all annotations? This cannot be undone.')) {
       try {
         const response = await fetch('/api/reset', { method: 'POST' });
         if (response.ok) {
           const data = await response.json();
+          Object.keys(vadTimers.current).forEach(cancelVadSave);
+          // Reset bumped the version of every labeled item; pick up the new ones
+          await reloadVersions();
           setMarkups({});
           setVadValues({});
+          savedTags.current = Object.fromEntries(mediaItems.map((item, index) => [index, null]));
           setStats(prev => ({
             ...prev,
             total_annotated: 0,
             pending: prev?.total_media || 0,
-            completion_rate: 0
+            completion_rate: 0,
+            emotion_summary: {},
+            vad_summary: {}
           }));
           alert(data.message);
         }
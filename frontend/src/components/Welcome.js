@@ -1,6 +1,10 @@
 import React from 'react';
+import { useLocalStorage } from '../hooks/useLocalStorage';
+import { STORAGE_KEYS } from '../utils/constants';
 
 const Welcome = ({ onStart }) => {
+  const [annotator, setAnnotator] = useLocalStorage(STORAGE_KEYS.ANNOTATOR, '');
+
   return (
     <div className="welcome-container" style={{
       minHeight: '100vh',
@@ -39,6 +43,25 @@ const Welcome = ({ onStart }) => {
           Welcome to the emotional markup application. 
           Click the button below to start tagging images and videos with emotional labels and VAD (Valence-Arousal) dimensions.
         </p>
+        <input
+          type="text"
+          value={annotator}
+          onChange={(e) => setAnnotator(e.target.value)}
+          placeholder="Your name (shown in annotator analytics)"
+          maxLength={100}
+          style={{
+            display: 'block',
+            width: '100%',
+            boxSizing: 'border-box',
+            padding: '0.75rem 1rem',
+            marginBottom: '1.5rem',
+            fontSize: '1rem',
+            borderRadius: '8px',
+            border: '1px solid #333',
+            backgroundColor: '#222',
+            color: '#fff'
+          }}
+        />
         <button 
           className="start-button"
           onClick={onStart}
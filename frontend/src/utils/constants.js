@@ -26,4 +26,6 @@ export const MEDIA_TYPES = {
 export const STORAGE_KEYS = {
   MARKUPS: 'markup_app_markups',
   CURRENT_INDEX: 'markup_app_current_index',
+  ANNOTATOR: 'markup_app_annotator',
+  SESSION_ID: 'markup_app_session_id',
 };
\ No newline at end of file
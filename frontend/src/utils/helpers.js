@@ -1,3 +1,5 @@
+import { STORAGE_KEYS } from './constants';
+
 export const validateMediaUrl = (url) => {
   try {
     new URL(url);
@@ -38,4 +40,21 @@ export const debounce = (func, wait) => {
     clearTimeout(timeout);
     timeout = setTimeout(later, wait);
   };
-};
\ No newline at end of file
+};
+
+// One id per browser tab, so analytics can tell annotation sessions apart
+export const getSessionId = () => {
+  let sessionId = window.sessionStorage.getItem(STORAGE_KEYS.SESSION_ID);
+  if (!sessionId) {
+    sessionId = window.crypto?.randomUUID?.()
+      || `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    window.sessionStorage.setItem(STORAGE_KEYS.SESSION_ID, sessionId);
+  }
+  return sessionId;
+};
+
+// Sent in request bodies rather than headers: names need not be Latin-1
+export const annotatorIdentity = (annotator) => ({
+  annotator: annotator || null,
+  sessionId: getSessionId(),
+});